@@ -0,0 +1,261 @@
+"""Offline benchmark of the full /extract/extract-text flow against a stub Gemini.
+
+Every request goes through the Flask app (upload, render, segment, OCR,
+optional verify) exactly as in production, but Gemini is replaced by a local
+stub with configurable latency, error rate and 429 behaviour, so runs need
+no network and no API key. Reports throughput, p50/p95 request latency and,
+per stage (from the job trace), p50/p95 unit latency and the peak RSS of the
+server process while that stage was running. Segmentation runs in worker
+processes, whose memory is not included.
+
+The bundled PDFs in processed_data are rendered when poppler is installed;
+otherwise (or with --sample-pages) the bundled page images stand in for the
+rendered pages.
+
+Usage:
+    python benchmarks/bench_extract.py [--pdf FILE ...] [--requests N] [--concurrency C]
+        [--latency-ms MS] [--jitter-ms MS] [--error-rate P] [--rate-limit-rate P] [--rate-limit-rpm N]
+        [--verify | --two-pass] [--warm-cache] [--json]
+"""
+import os
+import io
+import sys
+import glob
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from stubs import StubGemini, sample_page_source
+STAGES = ("rasterize", "segment", "encode", "gemini_call", "verify")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pdf", nargs="*", help="PDFs to upload (default: processed_data/*.pdf)")
+    parser.add_argument("--sample-pages", type=int, default=0, help="Use N bundled page images instead of rendering")
+    parser.add_argument("--render-ms", type=float, default=150.0, help="Simulated render time per sample page")
+    parser.add_argument("--requests", type=int, default=4, help="Extraction requests per PDF")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--latency-ms", type=float, default=1500.0, help="Stub Gemini latency per call")
+    parser.add_argument("--jitter-ms", type=float, default=300.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of calls failing with 503")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of calls failing with 429")
+    parser.add_argument("--rate-limit-rpm", type=int, default=0, help="Answer 429 above this many calls per minute")
+    parser.add_argument("--backoff", type=float, default=0.2, help="GEMINI_BACKOFF_SECONDS for the run")
+    parser.add_argument("--verify", action="store_true", help="Fused extract-and-verify (?verify=true)")
+    parser.add_argument("--two-pass", action="store_true", help="Call /verify/verify-japanese after each extraction")
+    parser.add_argument("--warm-cache", action="store_true", help="Keep OCR and verify caches between requests")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    return parser.parse_args()
+
+def configure_environment(args):
+    """Keep the run away from the real caches, crop folders and the network; must run before importing src."""
+    tmp = tempfile.mkdtemp(prefix="bench-extract-")
+    os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+    os.environ["OCR_CACHE_PATH"] = os.path.join(tmp, "ocr_cache.sqlite3")
+    os.environ["OCR_BACKEND"] = "gemini"
+    os.environ["PERSIST_CROPS"] = "false"
+    os.environ["CHECKPOINT_ENABLED"] = "false"
+    os.environ["GEMINI_BACKOFF_SECONDS"] = str(args.backoff)
+    os.environ["GEMINI_REQUESTS_PER_MINUTE"] = os.environ.get("GEMINI_REQUESTS_PER_MINUTE", "100000")
+    return tmp
+
+# ------------------- Memory Sampling -------------------
+def current_rss():
+    """Resident set size of this process in bytes (peak so far where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+class RSSSampler:
+    """Samples RSS every interval seconds on a background thread as (monotonic time, bytes)."""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.samples = []
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self.stopped.is_set():
+            self.samples.append((time.monotonic(), current_rss()))
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+
+    def peak_between(self, intervals):
+        """Highest sample inside any of the (start, end) intervals."""
+        intervals = sorted(intervals)
+        peak = 0
+        for t, rss in self.samples:
+            if any(start <= t <= end for start, end in intervals):
+                peak = max(peak, rss)
+        return peak
+
+# ------------------- Report -------------------
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+def summarize(runs, sampler, stub, wall):
+    latencies = [run["seconds"] for run in runs]
+    spans = defaultdict(list)
+    for run in runs:
+        for span in run["spans"]:
+            spans[span["name"]].append((run["trace_started"] + span["start"], span["seconds"]))
+        if "verify_seconds" in run:
+            spans["verify"].append((run["verify_started"], run["verify_seconds"]))
+
+    stages = {}
+    for stage in STAGES:
+        durations = [seconds for _, seconds in spans.get(stage, [])]
+        if not durations:
+            continue
+        stages[stage] = {
+            "count": len(durations),
+            "p50_ms": round(percentile(durations, 0.5) * 1000, 1),
+            "p95_ms": round(percentile(durations, 0.95) * 1000, 1),
+            "peak_rss_mb": round(sampler.peak_between([(s, s + d) for s, d in spans[stage]]) / 2 ** 20, 1),
+        }
+
+    pages = sum(run["pages"] for run in runs)
+    crops = sum(run["crops"] for run in runs)
+    return {
+        "requests": len(runs),
+        "errors": sum(1 for run in runs if run["status"] != 200),
+        "failed_crops": sum(run["failed_crops"] for run in runs),
+        "wall_seconds": round(wall, 2),
+        "throughput": {
+            "requests_per_s": round(len(runs) / wall, 3),
+            "pages_per_s": round(pages / wall, 2),
+            "crops_per_s": round(crops / wall, 2),
+        },
+        "latency_ms": {"p50": round(percentile(latencies, 0.5) * 1000), "p95": round(percentile(latencies, 0.95) * 1000)},
+        "peak_rss_mb": round(max(rss for _, rss in sampler.samples) / 2 ** 20, 1),
+        "stages": stages,
+        "stub_calls": dict(stub.counts),
+    }
+
+def print_report(report):
+    print(f"Requests:   {report['requests']} ({report['errors']} errors, {report['failed_crops']} failed crops) in {report['wall_seconds']}s")
+    t = report["throughput"]
+    print(f"Throughput: {t['requests_per_s']} req/s, {t['pages_per_s']} pages/s, {t['crops_per_s']} crops/s")
+    print(f"Latency:    p50 {report['latency_ms']['p50']} ms, p95 {report['latency_ms']['p95']} ms")
+    print(f"Peak RSS:   {report['peak_rss_mb']} MB")
+    print(f"Stub calls: {report['stub_calls']}")
+    print("\nStage         count    p50 ms    p95 ms  peak RSS MB")
+    for stage, s in report["stages"].items():
+        print(f"{stage:<12} {s['count']:6} {s['p50_ms']:9} {s['p95_ms']:9} {s['peak_rss_mb']:12}")
+
+# ------------------- Runner -------------------
+def main():
+    args = parse_args()
+    tmp = configure_environment(args)
+
+    import main as app_module
+    import src.extract_text_with_progress_bar as extract
+    import src.extract_text_recheck as recheck
+    from src.metrics import Trace
+    from src.model_client import set_model
+    from src.ocr_cache import OCRCache
+    from src.workspace import Workspace
+
+    stub = StubGemini(args.latency_ms / 1000, args.jitter_ms / 1000, args.error_rate,
+                      args.rate_limit_rate, args.rate_limit_rpm, args.seed)
+    set_model(stub)
+
+    pdfs = args.pdf or sorted(glob.glob(os.path.join(ROOT, "processed_data", "*.pdf")))
+    if args.sample_pages or not shutil.which("pdftoppm"):
+        count = args.sample_pages or 10
+        if not args.sample_pages:
+            print(f"poppler not found; using {count} bundled page images per request.", file=sys.stderr)
+        extract.count_pdf_pages, extract.iter_pdf_pages = sample_page_source(count, args.render_ms / 1000)
+        pdfs = pdfs[:1] or [__file__]  # The upload is saved but never read
+
+    # Cold runs give every request its own empty OCR cache, so concurrent requests cannot answer each other
+    local = threading.local()
+    shared_cache = extract.get_ocr_cache()
+    extract.get_ocr_cache = lambda: getattr(local, "cache", shared_cache)
+
+    # Remember when each request's trace began, to line its spans up with the RSS samples
+    trace_starts = {}
+
+    class ClockedTrace(Trace):
+        def __init__(self):
+            super().__init__()
+            trace_starts[threading.get_ident()] = self.started
+
+    extract.Trace = ClockedTrace
+
+    client = app_module.app.test_client()
+    query = "trace=true" + ("&verify=true" if args.verify else "")
+
+    def one_request(pdf_path, index):
+        if not args.warm_cache:
+            local.cache = OCRCache(os.path.join(tmp, f"ocr_cache_{index}.sqlite3"))
+            with recheck.verify_cache_lock:
+                recheck.verify_cache.clear()
+        with open(pdf_path, "rb") as f:
+            upload = io.BytesIO(f.read())
+
+        start = time.perf_counter()
+        response = client.post(f"/extract/extract-text?{query}", data={"file": (upload, os.path.basename(pdf_path))},
+                               content_type="multipart/form-data")
+        seconds = time.perf_counter() - start
+        body = response.get_json(silent=True) or {}
+        metrics = body.get("metrics", {})
+        spans = metrics.get("trace", {}).get("spans", [])
+        run = {
+            "status": response.status_code,
+            "seconds": seconds,
+            "pages": sum(1 for span in spans if span["name"] == "rasterize"),
+            "crops": len(body.get("extracted_data", [])),
+            "failed_crops": metrics.get("failed_crops", 0),
+            "spans": spans,
+            "trace_started": trace_starts.pop(threading.get_ident(), 0.0),
+        }
+        if args.two_pass and response.status_code == 200:
+            run["verify_started"] = time.monotonic()
+            client.get(f"/verify/verify-japanese?job_id={body['job_id']}")
+            run["verify_seconds"] = time.monotonic() - run["verify_started"]
+        if body.get("job_id"):
+            Workspace(body["job_id"]).delete()
+        return run
+
+    if args.warm_cache:
+        one_request(pdfs[0], -1)  # Fill the caches before measuring
+    jobs = [pdf for pdf in pdfs for _ in range(args.requests)]
+    with RSSSampler() as sampler:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            runs = list(pool.map(one_request, jobs, range(len(jobs))))
+        wall = time.perf_counter() - start
+
+    report = summarize(runs, sampler, stub, wall)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+if __name__ == "__main__":
+    main()
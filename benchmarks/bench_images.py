@@ -0,0 +1,84 @@
+"""Cost of the review screen's image requests: listing latency and bytes per refresh.
+
+Fills a temporary crops folder with --jobs jobs of --crops copies of the
+bundled crops, then through the Flask app measures a page of
+/extract/images against a full os.listdir of the job, and the bytes a
+review screen transfers on first load (full-size crops versus thumbnails)
+and on a refresh (revalidation with If-None-Match).
+
+Usage:
+    python benchmarks/bench_images.py [--jobs N] [--crops N] [--size PX] [--repeat N]
+"""
+import os
+import sys
+import glob
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=20)
+    parser.add_argument("--crops", type=int, default=2000, help="Crops per job")
+    parser.add_argument("--page", type=int, default=100, help="Images per listing page")
+    parser.add_argument("--size", type=int, default=256, help="Thumbnail size")
+    parser.add_argument("--repeat", type=int, default=50, help="Listing requests to time")
+    return parser.parse_args()
+
+def timed_ms(fn, repeat):
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        durations.append((time.perf_counter() - start) * 1000)
+    return statistics.median(durations)
+
+def main():
+    args = parse_args()
+    samples = sorted(glob.glob(os.path.join(ROOT, "static", "cropped_questions", "*.png")))
+    tmp = tempfile.mkdtemp(prefix="bench-images-")
+    os.chdir(tmp)  # The app keeps crops and workspaces under the working directory
+    os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+
+    for job in range(args.jobs):
+        folder = os.path.join("static", "cropped_questions", f"job{job}")
+        os.makedirs(folder)
+        for n in range(args.crops):
+            os.link(samples[n % len(samples)], os.path.join(folder, f"page_{n // 10 + 1}_question_{n}.png"))
+    past = time.time() - 60
+    for folder in glob.glob(os.path.join("static", "cropped_questions", "*")):
+        os.utime(folder, (past, past))  # Settled folders, as after a finished job
+
+    import main as app_module
+    client = app_module.app.test_client()
+    folder = os.path.join(tmp, "static", "cropped_questions", "job0")
+
+    listdir_ms = timed_ms(lambda: [f"/extract/images/job0/{name}" for name in os.listdir(folder)
+                                   if os.path.isfile(os.path.join(folder, name))], args.repeat)
+    page_ms = timed_ms(lambda: client.get(f"/extract/images?job_id=job0&limit={args.page}"), args.repeat)
+    print(f"Listing {args.crops} crops: full listdir {listdir_ms:.2f} ms, page of {args.page} {page_ms:.2f} ms (median)")
+
+    urls = [url.replace("http://localhost", "") for url in client.get(f"/extract/images?job_id=job0&limit={args.page}").get_json()["images"]]
+    full = [client.get(url) for url in urls]
+    start = time.perf_counter()
+    thumbs = [client.get(f"{url}?size={args.size}") for url in urls]
+    cold_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    thumbs = [client.get(f"{url}?size={args.size}") for url in urls]
+    warm_ms = (time.perf_counter() - start) * 1000
+    refresh = [client.get(f"{url}?size={args.size}", headers={"If-None-Match": r.headers["ETag"]}) for url, r in zip(urls, thumbs)]
+
+    print(f"First load of {len(urls)} images: full size {sum(len(r.data) for r in full) / 1024:.0f} KiB, "
+          f"thumbnails {sum(len(r.data) for r in thumbs) / 1024:.0f} KiB")
+    print(f"Thumbnails: {cold_ms:.0f} ms to create, {warm_ms:.0f} ms from cache")
+    print(f"Refresh: {sum(r.status_code == 304 for r in refresh)}/{len(refresh)} answered 304, "
+          f"{sum(len(r.data) for r in refresh)} bytes of bodies")
+    shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
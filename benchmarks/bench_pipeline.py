@@ -0,0 +1,106 @@
+"""End-to-end latency of the pipelined extraction vs. the sequential render -> segment -> OCR flow.
+
+Gemini is replaced by a stub that sleeps --gemini-ms per call, so the run is
+offline and repeatable. With --pdf the PDF is really rendered (needs
+poppler); otherwise the bundled sample pages are used and rendering is
+simulated with --render-ms per page.
+
+Usage:
+    python benchmarks/bench_pipeline.py [--pdf FILE] [--pages N] [--render-ms MS] [--gemini-ms MS] [--repeat R]
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep the benchmark away from the real cache and crop folders, and off the network
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+os.environ["OCR_CACHE_PATH"] = os.path.join(tempfile.mkdtemp(), "ocr_cache.sqlite3")
+os.environ["OCR_BACKEND"] = "gemini"
+os.environ["PERSIST_CROPS"] = "false"
+os.environ["CHECKPOINT_ENABLED"] = "false"  # Sample pages have no PDF to checkpoint against
+
+from flask import Flask
+from PIL import Image
+
+from src.socket_config import socketio
+socketio.init_app(Flask(__name__))  # Progress events need a bound server, even with no clients
+
+import src.extract_text_with_progress_bar as extract
+from src.workspace import Workspace
+from src.model_client import set_model
+from bench_segmentation import load_pages
+
+class StubModel:
+    """Answers every requested image ID after a fixed delay."""
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def generate_content(self, parts, **kwargs):
+        time.sleep(self.latency)
+        ids = [part[len("Image ID: "):] for part in parts if isinstance(part, str) and part.startswith("Image ID: ")]
+        return type("Response", (), {"text": json.dumps([{"id": image_id, "text": "stub"} for image_id in ids])})()
+
+def sample_pages(count, render_seconds):
+    """Stand-ins for count_pdf_pages / iter_pdf_pages that load the sample pages."""
+    paths = [path for _, path in load_pages()][:count]
+
+    def iter_pages(pdf_path, chunk_size=None, page_count=None, start_page=1):
+        for page_number, path in enumerate(paths[start_page - 1:], start_page):
+            time.sleep(render_seconds)
+            yield page_number, Image.open(path).convert("RGB")
+
+    return (lambda pdf_path: len(paths)), iter_pages
+
+def run(pdf_path, pipelined):
+    """Return (seconds, metrics) of one extraction with a fresh cache."""
+    extract.get_ocr_cache().conn.execute("DELETE FROM ocr_results")
+    extract.PIPELINE_ENABLED = pipelined
+    workspace = Workspace(uuid.uuid4().hex).create()
+    metrics = {}
+    try:
+        start = time.perf_counter()
+        extract.extract_pdf(pdf_path, workspace, metrics=metrics)
+        return time.perf_counter() - start, metrics
+    finally:
+        workspace.release()
+        workspace.delete()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pdf")
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--render-ms", type=float, default=150.0)
+    parser.add_argument("--gemini-ms", type=float, default=1500.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    set_model(StubModel(args.gemini_ms / 1000))
+    if not args.pdf:
+        extract.count_pdf_pages, extract.iter_pdf_pages = sample_pages(args.pages, args.render_ms / 1000)
+
+    results = {}
+    for name, pipelined in (("sequential", False), ("pipelined", True)):
+        runs = [run(args.pdf, pipelined) for _ in range(args.repeat)]
+        results[name] = min(runs, key=lambda r: r[0])
+
+    sequential, pipelined = results["sequential"][0], results["pipelined"][0]
+    print(f"Sequential: {sequential:.2f}s")
+    print(f"Pipelined:  {pipelined:.2f}s ({sequential / pipelined:.2f}x)")
+    print(f"Batches:    {results['pipelined'][1]['ocr_batch_sizes']}")
+
+    stages = results["pipelined"][1]["stages"]
+    print("\nStage       busy    wait-in  wait-out  utilization")
+    for name in ("render", "segment", "ocr"):
+        s = stages[name]
+        print(f"{name:<10} {s['busy_seconds']:6.2f}s {s['wait_input_seconds']:7.2f}s {s['wait_output_seconds']:8.2f}s  {s['utilization']:10.0%}")
+    print(f"Waiting for Gemini after the last page: {stages['finish_seconds']:.2f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Upload size, image tokens and estimated upload time of preprocessed crops vs. the original PNGs.
+
+Runs offline on the sample crops in static/cropped_questions. Upload time
+is estimated from the byte counts at --uplink-mbps; preprocessing time is
+measured.
+
+Usage:
+    python benchmarks/bench_preprocess.py [--format webp|jpeg|png] [--max-side N] [--quality Q] [--uplink-mbps M]
+"""
+import os
+import sys
+import glob
+import time
+import argparse
+
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.image_preprocess import prepare_upload
+from src.batch_planner import image_tokens
+
+CROPS_DIR = os.path.join("static", "cropped_questions")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--format", default="webp", choices=("webp", "jpeg", "png"))
+    parser.add_argument("--max-side", type=int, default=1024)
+    parser.add_argument("--quality", type=int, default=80)
+    parser.add_argument("--uplink-mbps", type=float, default=20.0)
+    args = parser.parse_args()
+
+    import src.image_preprocess as image_preprocess
+    image_preprocess.UPLOAD_MAX_SIDE = args.max_side
+
+    paths = sorted(glob.glob(os.path.join(CROPS_DIR, "*.png")))
+    if not paths:
+        sys.exit(f"No sample crops found in {CROPS_DIR}")
+
+    original_bytes = processed_bytes = 0
+    original_tokens = processed_tokens = 0
+    preprocess_seconds = 0.0
+
+    for path in paths:
+        with open(path, "rb") as f:
+            data = f.read()
+        img = cv2.imread(path)
+        original_bytes += len(data)
+        original_tokens += image_tokens(img.shape[1], img.shape[0])
+
+        start = time.perf_counter()
+        upload = prepare_upload(img, args.format, args.quality)
+        preprocess_seconds += time.perf_counter() - start
+
+        processed_bytes += len(upload["data"])
+        processed_tokens += image_tokens(upload["width"], upload["height"])
+
+    bytes_per_second = args.uplink_mbps * 1_000_000 / 8
+    original_upload = original_bytes / bytes_per_second
+    processed_upload = processed_bytes / bytes_per_second
+
+    print(f"Crops:               {len(paths)}")
+    print(f"Settings:            {args.format}, max side {args.max_side}, quality {args.quality}")
+    print(f"Bytes:               {original_bytes:,} -> {processed_bytes:,} "
+          f"({1 - processed_bytes / original_bytes:.1%} saved)")
+    print(f"Image tokens:        {original_tokens:,} -> {processed_tokens:,} "
+          f"({1 - processed_tokens / original_tokens:.1%} saved)")
+    print(f"Preprocess time:     {preprocess_seconds * 1000:.1f} ms total, "
+          f"{preprocess_seconds * 1000 / len(paths):.2f} ms/crop")
+    print(f"Upload @ {args.uplink_mbps:g} Mbps:    {original_upload * 1000:.0f} ms -> "
+          f"{(processed_upload + preprocess_seconds) * 1000:.0f} ms incl. preprocessing")
+
+if __name__ == "__main__":
+    main()
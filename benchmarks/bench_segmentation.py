@@ -0,0 +1,55 @@
+"""Compare serial and process-pool page segmentation on the bundled sample pages.
+
+Usage:
+    python benchmarks/bench_segmentation.py [--workers N] [--repeat R]
+"""
+import os
+import sys
+import glob
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.segmentation import segment_pages
+
+PAGES_DIR = os.path.join("processed_data", "pdf_images")
+
+def load_pages():
+    """Return (page_number, path) pairs for the sample pages, sorted by page number."""
+    paths = glob.glob(os.path.join(PAGES_DIR, "page_*.png"))
+    paths.sort(key=lambda p: int(os.path.basename(p)[len("page_"):-len(".png")]))
+    return [(int(os.path.basename(p)[len("page_"):-len(".png")]), p) for p in paths]
+
+def run(pages, workers, repeat):
+    """Return the best wall time and the crop filenames produced with the given worker count."""
+    best = float("inf")
+    filenames = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        filenames = [crop["filename"] for crop in segment_pages(iter(pages), workers=workers)]
+        best = min(best, time.perf_counter() - start)
+    return best, filenames
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    pages = load_pages()
+    if not pages:
+        sys.exit(f"No sample pages found in {PAGES_DIR}")
+
+    serial_time, serial_files = run(pages, 1, args.repeat)
+    pooled_time, pooled_files = run(pages, args.workers, args.repeat)
+
+    print(f"Pages:              {len(pages)}")
+    print(f"Crops:              {len(serial_files)}")
+    print(f"Serial:             {serial_time:.3f}s ({len(pages) / serial_time:.1f} pages/s)")
+    print(f"Pool ({args.workers} workers): {pooled_time:.3f}s ({len(pages) / pooled_time:.1f} pages/s)")
+    print(f"Speedup:            {serial_time / pooled_time:.2f}x")
+    print(f"Same ordering:      {serial_files == pooled_files}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Accuracy and throughput of the segmentation engines on the bundled sample pages.
+
+The original findContours engine (fixed threshold 150) is the reference,
+for the boxes found and for the order they are numbered in ("same order":
+pages whose crop filenames would name the same boxes).
+Each page is also re-run as a synthetic faint scan (ink lightened towards
+the paper colour) to show how the per-page threshold copes with it, and as
+a synthetic dense scan (speckle noise producing thousands of tiny
+contours) to measure throughput when the per-contour loop dominates.
+
+Usage:
+    python benchmarks/bench_segmentation_engines.py [--repeat R] [--fade F] [--specks N]
+"""
+import os
+import sys
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.segmentation import extract_questions_contours, find_question_boxes
+from bench_segmentation import load_pages
+
+def reference_boxes(img):
+    """Reference boxes from the original engine, recovered from its crop views."""
+    boxes = []
+    base = img.__array_interface__["data"][0]
+    row_stride, col_stride = img.strides[:2]
+    for crop in extract_questions_contours(img):
+        offset = crop.__array_interface__["data"][0] - base
+        y, x = offset // row_stride, (offset % row_stride) // col_stride
+        boxes.append((x, y, crop.shape[1], crop.shape[0]))
+    return np.array(boxes, dtype=np.int64).reshape(-1, 4)
+
+def iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[0] + a[2], b[0] + b[2]), min(a[1] + a[3], b[1] + b[3])
+    inter = max(0, x2 - x1) * max(0, y2 - y1)
+    return inter / float(a[2] * a[3] + b[2] * b[3] - inter)
+
+def matched(reference, found, threshold=0.9):
+    """Number of reference boxes with a found box of IoU >= threshold."""
+    return sum(1 for ref in reference if any(iou(ref, box) >= threshold for box in found))
+
+def same_order(reference, found, threshold=0.9):
+    """Whether found numbers the same boxes as reference in the same order (same crop filenames)."""
+    return len(reference) == len(found) and all(iou(ref, box) >= threshold for ref, box in zip(reference, found))
+
+def fade(img, amount):
+    """Simulate a faint scan by pulling every pixel towards white."""
+    return (img.astype(np.float32) * (1 - amount) + 255 * amount).astype(np.uint8)
+
+def speckle(img, count, seed=0):
+    """Simulate a dense, dirty scan by sprinkling count small dark specks over the page."""
+    rng = np.random.default_rng(seed)
+    noisy = img.copy()
+    ys = rng.integers(0, img.shape[0] - 3, count)
+    xs = rng.integers(0, img.shape[1] - 3, count)
+    for y, x in zip(ys, xs):
+        noisy[y:y + 3, x:x + 3] = 0
+    return noisy
+
+def timed(fn, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--fade", type=float, default=0.6, help="How far ink is lightened for the faint-scan run")
+    parser.add_argument("--specks", type=int, default=3000, help="Specks added per page for the dense-scan run")
+    args = parser.parse_args()
+
+    pages = load_pages()
+    if not pages:
+        sys.exit("No sample pages found")
+
+    totals = {"reference": 0, "contours_time": 0.0, "contours_faint": 0, "contours_dense_time": 0.0}
+    modes = ("fixed", "otsu", "adaptive")
+    for mode in modes:
+        totals.update({f"{mode}_time": 0.0, f"{mode}_boxes": 0, f"{mode}_matched": 0, f"{mode}_ordered": 0, f"{mode}_faint": 0, f"{mode}_dense_time": 0.0})
+
+    for _, path in pages:
+        img = cv2.imread(path)
+        faint = fade(img, args.fade)
+        faint_gray = cv2.cvtColor(faint, cv2.COLOR_BGR2GRAY)
+        dense = speckle(img, args.specks)
+
+        elapsed, reference = timed(lambda: reference_boxes(img), args.repeat)
+        totals["reference"] += len(reference)
+        totals["contours_time"] += elapsed
+        totals["contours_faint"] += matched(reference, reference_boxes(faint))
+        totals["contours_dense_time"] += timed(lambda: extract_questions_contours(dense), args.repeat)[0]
+
+        for mode in modes:
+            elapsed, boxes = timed(lambda: find_question_boxes(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY), mode), args.repeat)
+            totals[f"{mode}_time"] += elapsed
+            totals[f"{mode}_boxes"] += len(boxes)
+            totals[f"{mode}_matched"] += matched(reference, boxes)
+            totals[f"{mode}_ordered"] += same_order(reference, boxes)
+            totals[f"{mode}_faint"] += matched(reference, find_question_boxes(faint_gray, mode))
+            totals[f"{mode}_dense_time"] += timed(
+                lambda: find_question_boxes(cv2.cvtColor(dense, cv2.COLOR_BGR2GRAY), mode), args.repeat
+            )[0]
+
+    reference = totals["reference"]
+    print(f"Pages: {len(pages)}   reference boxes (contours engine): {reference}")
+    print(f"{'engine':<22}{'pages/s':>10}{'dense pages/s':>15}{'boxes':>8}{'recall':>9}{'same order':>12}{'faint recall':>14}")
+    print(f"{'contours (original)':<22}{len(pages) / totals['contours_time']:>10.1f}"
+          f"{len(pages) / totals['contours_dense_time']:>15.1f}{reference:>8}"
+          f"{1.0:>9.2%}{1.0:>12.2%}{totals['contours_faint'] / reference:>14.2%}")
+    for mode in modes:
+        print(f"{'boxes/' + mode:<22}{len(pages) / totals[f'{mode}_time']:>10.1f}"
+              f"{len(pages) / totals[f'{mode}_dense_time']:>15.1f}{totals[f'{mode}_boxes']:>8}"
+              f"{totals[f'{mode}_matched'] / reference:>9.2%}{totals[f'{mode}_ordered'] / len(pages):>12.2%}"
+              f"{totals[f'{mode}_faint'] / reference:>14.2%}")
+
+if __name__ == "__main__":
+    main()
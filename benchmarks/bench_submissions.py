@@ -0,0 +1,63 @@
+"""Insert latency of the submission store as it grows.
+
+Inserts --total records in submissions of --batch records into a temporary
+store and prints the mean and p95 insert latency of each tenth of the run,
+which should stay flat from the first tenth to the last. Then times one
+export pass (iter_latest) over the store; crop filenames repeat in every
+job as they do in real uploads, which should not make it quadratic.
+
+Usage:
+    python benchmarks/bench_submissions.py [--total N] [--batch B]
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.submission_store import SubmissionStore
+
+def make_submission(start, size):
+    return [
+        {
+            "image_url": f"http://localhost:5000/static/cropped_questions/job{n % 500}/question_{n % 40 + 1}_1.png",
+            "text": f"としもんだい {n}",
+        }
+        for n in range(start, start + size)
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--total", type=int, default=1_000_000)
+    parser.add_argument("--batch", type=int, default=20)
+    args = parser.parse_args()
+
+    store = SubmissionStore(os.path.join(tempfile.mkdtemp(), "submissions.sqlite3"))
+    submissions = args.total // args.batch
+    tenth = max(1, submissions // 10)
+    latencies = []
+
+    print("Records     mean ms   p95 ms")
+    for i in range(submissions):
+        items = make_submission(i * args.batch, args.batch)
+        start = time.perf_counter()
+        store.insert(items)
+        latencies.append((time.perf_counter() - start) * 1000)
+        if len(latencies) == tenth:
+            p95 = statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0]
+            print(f"{(i + 1) * args.batch:>9,}  {statistics.mean(latencies):8.3f}  {p95:7.3f}")
+            latencies = []
+
+    start = time.perf_counter()
+    records = store.query(job_id="job7", limit=100)
+    print(f"\nQuery by job (100 newest): {(time.perf_counter() - start) * 1000:.2f} ms, {len(records)} records")
+
+    start = time.perf_counter()
+    latest = sum(1 for _ in store.iter_latest())
+    print(f"Export pass (latest per URL): {time.perf_counter() - start:.2f} s, {latest} records")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""Load test of a running server: concurrent PDF uploads, with optional Socket.IO progress listeners.
+
+Each simulated client uploads a PDF to /extract/extract-text, either
+synchronously or with ?async=true followed by polling its job, and with
+--socketio first connects to the server and joins its job's progress room,
+counting the progress events it receives. Reports throughput, p50/p95
+latency, 503s (queue full) and other errors.
+
+To test without Gemini or an API key, let the script start the server with
+the stub from stubs.py (STUB_* variables set its latency and errors):
+
+    python benchmarks/load_test.py --spawn --workers 2 --clients 20
+
+Usage:
+    python benchmarks/load_test.py [--url URL ...] [--pdf FILE] [--clients N] [--requests N]
+        [--async] [--socketio] [--spawn [--workers N] [--port PORT]] [--json]
+"""
+import os
+import sys
+import glob
+import json
+import time
+import uuid
+import signal
+import argparse
+import tempfile
+import threading
+import subprocess
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+POLL_SECONDS = 0.5
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", nargs="*", help="Server URLs, used round-robin (default: the spawned workers)")
+    parser.add_argument("--pdf", help="PDF to upload (default: the first in processed_data)")
+    parser.add_argument("--clients", type=int, default=10, help="Concurrent clients")
+    parser.add_argument("--requests", type=int, default=2, help="Uploads per client")
+    parser.add_argument("--async", dest="use_async", action="store_true", help="Queue jobs (?async=true) and poll them")
+    parser.add_argument("--socketio", action="store_true", help="Listen to each job's progress events")
+    parser.add_argument("--timeout", type=float, default=600.0, help="Seconds before a request counts as failed")
+    parser.add_argument("--spawn", action="store_true", help="Start serve.py with the Gemini stub for the run")
+    parser.add_argument("--workers", type=int, default=1, help="Workers of the spawned server")
+    parser.add_argument("--port", type=int, default=5100, help="First port of the spawned server")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    return parser.parse_args()
+
+# ------------------- Spawned Server -------------------
+def spawn_server(args):
+    """Start serve.py with the Gemini stub preloaded and wait until every worker answers."""
+    tmp = tempfile.mkdtemp(prefix="load-test-")
+    env = dict(os.environ)
+    env.setdefault("GOOGLE_API_KEY", "load-test")
+    env.setdefault("JOBS_DB_PATH", os.path.join(tmp, "jobs.sqlite3"))
+    env.setdefault("OCR_CACHE_PATH", os.path.join(tmp, "ocr_cache.sqlite3"))
+    env.setdefault("CHECKPOINT_ENABLED", "false")
+    env.setdefault("OCR_BACKEND", "gemini")
+    env.setdefault("PERSIST_CROPS", "false")
+    env.setdefault("GEMINI_REQUESTS_PER_MINUTE", "100000")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT, env.get("PYTHONPATH")]))
+    command = [sys.executable, os.path.join(ROOT, "serve.py"), "--workers", str(args.workers),
+               "--host", "127.0.0.1", "--port", str(args.port), "--preload", "benchmarks.stubs:install"]
+    server = subprocess.Popen(command, env=env, cwd=ROOT)
+    urls = [f"http://127.0.0.1:{args.port + i}" for i in range(args.workers)]
+
+    deadline = time.monotonic() + 60
+    for url in urls:
+        while True:
+            try:
+                requests.get(f"{url}/metrics", timeout=1)
+                break
+            except (requests.ConnectionError, requests.Timeout):  # gunicorn accepts before its worker has the app
+                if server.poll() is not None or time.monotonic() > deadline:
+                    stop_server(server)
+                    sys.exit(f"Server did not start on {url}")
+                time.sleep(0.2)
+    return server, urls
+
+def stop_server(server):
+    server.send_signal(signal.SIGTERM)
+    try:
+        server.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        server.kill()
+
+# ------------------- Clients -------------------
+class EventCounter:
+    """Progress events received per job, updated from the Socket.IO client threads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = Counter()
+
+    def add(self, job_id):
+        with self.lock:
+            self.counts[job_id] += 1
+
+def listen(url, job_id, events):
+    """A Socket.IO client joined to job_id's progress room, counting its events in events."""
+    import socketio
+
+    client = socketio.Client(reconnection=False)
+    client.on("progress", lambda payload: events.add(payload.get("job_id")))
+    client.connect(url, transports=["polling"], wait_timeout=10)
+    client.emit("join", {"job_id": job_id})
+    return client
+
+def wait_for_job(session, url, job_id, deadline):
+    while time.monotonic() < deadline:
+        job = session.get(f"{url}/extract/jobs/{job_id}", timeout=30).json()
+        if job.get("status") in ("completed", "failed"):
+            return job["status"] == "completed"
+        time.sleep(POLL_SECONDS)
+    return False
+
+def one_upload(args, url, pdf_bytes, events):
+    """Upload once; returns (outcome, seconds) where outcome is ok, 503, timeout or an error description."""
+    session = requests.Session()
+    job_id = uuid.uuid4().hex
+    listener = None
+    start = time.perf_counter()
+    deadline = time.monotonic() + args.timeout
+    try:
+        if args.socketio and not args.use_async:
+            listener = listen(url, job_id, events)  # Sync uploads take their job ID from the form
+        files = {"file": ("load_test.pdf", pdf_bytes, "application/pdf")}
+        if args.use_async:
+            response = session.post(f"{url}/extract/extract-text?async=true", files=files, timeout=args.timeout)
+            if response.status_code != 202:
+                return str(response.status_code), time.perf_counter() - start
+            job_id = response.json()["job_id"]
+            if args.socketio:
+                listener = listen(url, job_id, events)
+            ok = wait_for_job(session, url, job_id, deadline)
+            return ("ok" if ok else "failed"), time.perf_counter() - start
+        response = session.post(f"{url}/extract/extract-text", files=files, data={"job_id": job_id}, timeout=args.timeout)
+        return ("ok" if response.status_code == 200 else str(response.status_code)), time.perf_counter() - start
+    except requests.Timeout:
+        return "timeout", time.perf_counter() - start
+    except Exception as e:
+        return type(e).__name__, time.perf_counter() - start
+    finally:
+        if listener:
+            listener.disconnect()
+
+# ------------------- Report -------------------
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+def main():
+    args = parse_args()
+    server = None
+    urls = args.url
+    if args.spawn:
+        server, spawned = spawn_server(args)
+        urls = urls or spawned
+    if not urls:
+        sys.exit("Pass --url or --spawn")
+
+    pdf = args.pdf or sorted(glob.glob(os.path.join(ROOT, "processed_data", "*.pdf")))[0]
+    with open(pdf, "rb") as f:
+        pdf_bytes = f.read()
+    events = EventCounter()
+
+    def client(index):
+        return [one_upload(args, urls[(index + n) % len(urls)], pdf_bytes, events) for n in range(args.requests)]
+
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.clients) as pool:
+            results = [outcome for outcomes in pool.map(client, range(args.clients)) for outcome in outcomes]
+        wall = time.perf_counter() - start
+    finally:
+        if server:
+            stop_server(server)
+
+    latencies = [seconds for outcome, seconds in results if outcome == "ok"]
+    outcomes = Counter(outcome for outcome, _ in results)
+    report = {
+        "requests": len(results),
+        "ok": outcomes.pop("ok", 0),
+        "rejected_503": outcomes.pop("503", 0),
+        "errors": dict(outcomes),
+        "wall_seconds": round(wall, 2),
+        "requests_per_s": round(len(latencies) / wall, 3),
+        "latency_ms": {
+            "p50": latencies and round(percentile(latencies, 0.5) * 1000),
+            "p95": latencies and round(percentile(latencies, 0.95) * 1000),
+        },
+    }
+    if args.socketio:
+        report["progress_events"] = sum(events.counts.values())
+        report["jobs_with_progress"] = len(events.counts)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"Requests:   {report['requests']} ({report['ok']} ok, {report['rejected_503']} rejected with 503, errors {report['errors']})")
+    print(f"Throughput: {report['requests_per_s']} req/s over {report['wall_seconds']}s")
+    print(f"Latency:    p50 {report['latency_ms']['p50']} ms, p95 {report['latency_ms']['p95']} ms")
+    if args.socketio:
+        print(f"Progress:   {report['progress_events']} events for {report['jobs_with_progress']} jobs")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Offline stand-ins for Gemini and PDF rendering, shared by the benchmarks.
+
+install() puts them into a running app from STUB_* environment variables;
+serve.py workers load it with --preload benchmarks.stubs:install (see load_test.py).
+"""
+import os
+import re
+import glob
+import json
+import time
+import random
+import shutil
+import threading
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class StubGemini:
+    """Stands in for genai.GenerativeModel: answers OCR, fused and verify prompts after a delay.
+
+    Calls fail with 503 (error_rate) or 429 (rate_limit_rate, or above
+    rate_limit_rpm calls in the last minute) before any answer is produced.
+    """
+
+    def __init__(self, latency, jitter, error_rate=0.0, rate_limit_rate=0.0, rate_limit_rpm=0, seed=0):
+        from google.api_core import exceptions
+        self.exceptions = exceptions
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.rate_limit_rpm = rate_limit_rpm
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.recent = []
+        self.counts = defaultdict(int)
+
+    def _admit(self):
+        with self.lock:
+            now = time.monotonic()
+            self.recent = [t for t in self.recent if now - t < 60]
+            roll = self.random.random()
+            if self.rate_limit_rpm and len(self.recent) >= self.rate_limit_rpm or roll < self.rate_limit_rate:
+                self.counts["429"] += 1
+                raise self.exceptions.TooManyRequests("stub: rate limited")
+            if roll < self.rate_limit_rate + self.error_rate:
+                self.counts["503"] += 1
+                raise self.exceptions.ServiceUnavailable("stub: unavailable")
+            self.recent.append(now)
+            self.counts["ok"] += 1
+            return max(0.0, self.random.gauss(self.latency, self.jitter))
+
+    def generate_content(self, parts, generation_config=None, **kwargs):
+        time.sleep(self._admit())
+        if isinstance(parts, str):  # Verify prompt: "t1: text" lines
+            answers = [{"id": text_id, "verdict": "Correct"} for text_id in re.findall(r"^(t\d+): ", parts, re.M)]
+        else:
+            ids = [part[len("Image ID: "):] for part in parts if isinstance(part, str) and part.startswith("Image ID: ")]
+            answers = [{"id": image_id, "text": "スタブ", "verdict": "Correct"} for image_id in ids]
+        return type("Response", (), {"text": json.dumps(answers, ensure_ascii=False)})()
+
+def sample_page_source(count, render_seconds):
+    """count_pdf_pages / iter_pdf_pages stand-ins serving the bundled page images."""
+    from PIL import Image
+    paths = sorted(glob.glob(os.path.join(ROOT, "processed_data", "pdf_images", "page_*.png")),
+                   key=lambda p: int(re.search(r"page_(\d+)", p).group(1)))[:count]
+
+    def iter_pages(pdf_path, chunk_size=None, page_count=None, start_page=1):
+        for page_number, path in enumerate(paths[start_page - 1:], start_page):
+            time.sleep(render_seconds)
+            yield page_number, Image.open(path).convert("RGB")
+
+    return (lambda pdf_path: len(paths)), iter_pages
+
+def install():
+    """Route this process's Gemini calls to a StubGemini, and render sample pages if poppler is missing.
+
+    Settings: STUB_LATENCY_MS, STUB_JITTER_MS, STUB_ERROR_RATE, STUB_RATE_LIMIT_RATE,
+    STUB_RATE_LIMIT_RPM, STUB_SAMPLE_PAGES and STUB_RENDER_MS.
+    """
+    import src.extract_text_with_progress_bar as extract
+    from src.model_client import set_model
+
+    set_model(StubGemini(
+        float(os.getenv("STUB_LATENCY_MS", "1500")) / 1000,
+        float(os.getenv("STUB_JITTER_MS", "300")) / 1000,
+        float(os.getenv("STUB_ERROR_RATE", "0")),
+        float(os.getenv("STUB_RATE_LIMIT_RATE", "0")),
+        int(os.getenv("STUB_RATE_LIMIT_RPM", "0")),
+        seed=os.getpid(),
+    ))
+    sample_pages = int(os.getenv("STUB_SAMPLE_PAGES", "0"))
+    if sample_pages or not shutil.which("pdftoppm"):
+        extract.count_pdf_pages, extract.iter_pdf_pages = sample_page_source(
+            sample_pages or 10, float(os.getenv("STUB_RENDER_MS", "150")) / 1000
+        )
@@ -1,8 +1,13 @@
-from flask import Flask
+import os
+from flask import Flask, Response
 from flask_cors import CORS
 from src.socket_config import socketio  # Import from socket_config.py
+from src.metrics import render_metrics, METRICS_CONTENT_TYPE
+from src.crop_images import IMAGE_CACHE_MAX_AGE
 
 app = Flask(__name__)
+# Record image_urls point at /static/cropped_questions; let browsers cache them like /extract/images
+app.config["SEND_FILE_MAX_AGE_DEFAULT"] = IMAGE_CACHE_MAX_AGE
 
 # Enable CORS globally for all routes and origins
 CORS(app, resources={r"/*": {"origins": "*"}})
@@ -11,7 +16,7 @@ CORS(app, resources={r"/*": {"origins": "*"}})
 socketio.init_app(app, cors_allowed_origins="*")
 
 #  Import Blueprints **AFTER** initializing Flask & socketio
-from src.extract_text_with_progress_bar import extract_bp
+from src.extract_text_with_progress_bar import extract_bp, start_job_queue
 from src.extract_text_recheck import verify_bp
 from src.submit_data import submit_bp
 
@@ -24,8 +29,16 @@ app.register_blueprint(submit_bp, url_prefix="/submit")
 def home():
     return {"message": "Welcome to the Unified Flask API!"}
 
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Prometheus scrape endpoint: stage latency histograms, upload bytes, cache and Gemini counters."""
+    return Response(render_metrics(), content_type=METRICS_CONTENT_TYPE)
+
 #  Run with WebSockets enabled
 if __name__ == "__main__":
+    # debug=True runs the server in a reloader child; only that process runs jobs
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_job_queue()
     socketio.run(app, debug=True, host="0.0.0.0", port=5000, allow_unsafe_werkzeug=True)
 
 
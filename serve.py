@@ -0,0 +1,151 @@
+"""Production entry point: the API and its Socket.IO progress events on gunicorn.
+
+    python serve.py [--workers N] [--host HOST] [--port PORT] [--threads T]
+
+Each worker is a gunicorn server with one threaded (gthread) worker
+process serving the whole app, with debug, the reloader and per-request
+logging off. Threads are the concurrency model the extraction pipeline
+(its process pools, SQLite and OpenCV) is built and tested for, and
+Flask-SocketIO serves WebSockets on them through simple-websocket.
+gunicorn restarts its worker process if it dies; a restarted worker takes
+back the jobs it held. gunicorn does not run on Windows; main.py remains
+the development server.
+
+With N workers they listen on PORT .. PORT+N-1; put them behind a proxy
+with sticky sessions (Socket.IO long-polling needs every request of a
+client to reach the same worker), e.g. nginx:
+
+    upstream ocr { ip_hash; server 127.0.0.1:5000; server 127.0.0.1:5001; }
+
+Set SOCKETIO_MESSAGE_QUEUE (e.g. redis://localhost:6379/0) so progress
+events emitted by the worker running a job reach clients connected to any
+worker. Gemini rate limits are split evenly between the workers, and only
+the first one resumes jobs left unfinished by a previous run.
+"""
+import os
+import sys
+import argparse
+
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "5000"))
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", "1"))
+# Requests a worker serves at once; every Socket.IO connection and sync extraction holds one thread
+SERVER_THREADS = int(os.getenv("SERVER_THREADS", "100"))
+LOG_LEVEL = os.getenv("LOG_LEVEL", "WARNING")  # main.py logs at INFO
+RESTART_DELAY_SECONDS = 2
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS)
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    parser.add_argument("--threads", type=int, default=SERVER_THREADS)
+    parser.add_argument("--preload", help="module:function called in each worker once the app is loaded")
+    parser.add_argument("--worker-index", type=int, help=argparse.SUPPRESS)  # Set by the supervisor
+    return parser.parse_args()
+
+# ------------------- Worker -------------------
+def load_app(args):
+    """Import the app in gunicorn's worker process and start its job queue there."""
+    import logging
+    from main import app
+    from src.socket_config import SOCKETIO_MESSAGE_QUEUE
+    from src.extract_text_with_progress_bar import start_job_queue
+
+    if args.preload:
+        import importlib
+        module, _, function = args.preload.partition(":")
+        getattr(importlib.import_module(module), function or "install")()
+    start_job_queue()  # After the preload, so resumed jobs already see it
+    if args.workers > 1 and not SOCKETIO_MESSAGE_QUEUE:
+        logging.warning("SOCKETIO_MESSAGE_QUEUE is not set; progress events only reach clients of the same worker.")
+    return app
+
+def run_worker(args):
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        sys.exit("serve.py needs gunicorn (pip install -r requirements.txt), which does not run on Windows; "
+                 "use main.py there.")
+    os.environ["SOCKETIO_ASYNC_MODE"] = "threading"
+
+    import logging
+    # The first basicConfig call wins, so this sets the level for every module of the app
+    logging.basicConfig(level=LOG_LEVEL.upper(), format="%(asctime)s - %(levelname)s - %(message)s")
+
+    class WorkerServer(BaseApplication):
+        """gunicorn serving the app from one gthread worker process, loaded after the fork."""
+
+        def load_config(self):
+            self.cfg.set("bind", f"{args.host}:{args.port}")
+            self.cfg.set("workers", 1)  # Socket.IO sessions live in the process; more would need sticky routing
+            self.cfg.set("worker_class", "gthread")
+            self.cfg.set("threads", args.threads)
+            self.cfg.set("loglevel", LOG_LEVEL.lower())
+
+        def load(self):
+            return load_app(args)
+
+    print(f"Worker {args.worker_index or 0} listening on {args.host}:{args.port}", flush=True)
+    WorkerServer().run()
+
+# ------------------- Supervisor -------------------
+def worker_environment(index, workers, started_at):
+    """Environment of worker index: its worker ID, its share of the Gemini rate limits and whether it resumes old jobs."""
+    from src.gemini_scheduler import GEMINI_REQUESTS_PER_MINUTE, GEMINI_TOKENS_PER_MINUTE, GEMINI_MAX_IN_FLIGHT
+
+    env = dict(os.environ)
+    env["GEMINI_REQUESTS_PER_MINUTE"] = str(max(1, GEMINI_REQUESTS_PER_MINUTE // workers))
+    env["GEMINI_TOKENS_PER_MINUTE"] = str(max(1, GEMINI_TOKENS_PER_MINUTE // workers))
+    env["GEMINI_MAX_IN_FLIGHT"] = str(max(1, GEMINI_MAX_IN_FLIGHT // workers))
+    env["EXTRACT_WORKER_ID"] = str(index)  # Jobs record it, so a restarted worker takes back its own
+    env["EXTRACT_RECOVER_JOBS"] = "true" if index == 0 else "false"
+    # Only jobs older than the supervisor count as left by a previous run, however often a worker restarts
+    env["EXTRACT_RECOVER_BEFORE"] = str(started_at)
+    return env
+
+def supervise(args):
+    """Run one worker per port, restarting any that exits, until interrupted."""
+    import time
+    import signal
+    import subprocess
+
+    started_at = time.time()
+    children = {}
+
+    def spawn(index):
+        command = [sys.executable, os.path.abspath(__file__), "--worker-index", str(index), "--workers", str(args.workers),
+                   "--host", args.host, "--port", str(args.port + index), "--threads", str(args.threads)]
+        if args.preload:
+            command += ["--preload", args.preload]
+        children[index] = subprocess.Popen(command, env=worker_environment(index, args.workers, started_at))
+
+    def stop(signum, frame):
+        for child in children.values():
+            child.terminate()
+        for child in children.values():
+            child.wait()
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for index in range(args.workers):
+        spawn(index)
+
+    while True:
+        time.sleep(1)
+        for index, child in list(children.items()):
+            if child.poll() is not None:
+                print(f"Worker {index} exited with {child.returncode}; restarting.", file=sys.stderr, flush=True)
+                time.sleep(RESTART_DELAY_SECONDS)
+                spawn(index)
+
+def main():
+    args = parse_args()
+    if args.worker_index is None and args.workers > 1:
+        supervise(args)
+    else:
+        run_worker(args)
+
+if __name__ == "__main__":
+    main()
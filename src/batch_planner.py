@@ -0,0 +1,130 @@
+import os
+import math
+import time
+import struct
+import logging
+import threading
+
+# Configure Logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# Per-request packing limits; the token budget adapts between the min and max
+BATCH_MIN_TOKENS = int(os.getenv("BATCH_MIN_TOKENS", "1000"))
+BATCH_MAX_TOKENS = int(os.getenv("BATCH_MAX_TOKENS", "32000"))
+BATCH_INITIAL_TOKENS = int(os.getenv("BATCH_INITIAL_TOKENS", "8000"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "50"))
+BATCH_TARGET_LATENCY = float(os.getenv("BATCH_TARGET_LATENCY", "10.0"))  # Seconds per call
+
+IMAGE_TILE = 768
+IMAGE_TILE_TOKENS = 258
+SMALL_IMAGE_SIDE = 384
+
+def image_tokens(width, height):
+    """Gemini image token cost: one tile for small images, otherwise one per 768px tile."""
+    if width <= SMALL_IMAGE_SIDE and height <= SMALL_IMAGE_SIDE:
+        return IMAGE_TILE_TOKENS
+    return IMAGE_TILE_TOKENS * math.ceil(width / IMAGE_TILE) * math.ceil(height / IMAGE_TILE)
+
+def image_size(data):
+    """(width, height) from a PNG header, or None for other formats."""
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and len(data) >= 24:
+        return struct.unpack(">II", data[16:24])
+    return None
+
+def crop_tokens(crop):
+    """Estimated image tokens of a crop part, from its recorded size or its PNG header."""
+    if "width" in crop and "height" in crop:
+        return image_tokens(crop["width"], crop["height"])
+    size = image_size(crop["data"])
+    return image_tokens(*size) if size else IMAGE_TILE_TOKENS
+
+def text_tokens(text):
+    return len(text) // 4 + 8  # Plus the per-item ID and separators
+
+class BatchPlanner:
+    """Packs items into batches under a token budget that adapts to observed latency and errors.
+
+    After every call the budget moves towards the size that would have taken
+    BATCH_TARGET_LATENCY, and is halved on failures, so batches grow while
+    the API is fast and healthy and shrink when it slows down or errors.
+    """
+
+    def __init__(self, name, initial_tokens=BATCH_INITIAL_TOKENS, min_tokens=BATCH_MIN_TOKENS,
+                 max_tokens=BATCH_MAX_TOKENS, max_items=BATCH_MAX_ITEMS, target_latency=BATCH_TARGET_LATENCY):
+        self.name = name
+        self.token_budget = float(initial_tokens)
+        self.min_tokens = min_tokens
+        self.max_tokens = max_tokens
+        self.max_items = max_items
+        self.target_latency = target_latency
+        self.seconds_per_token = None
+        self.error_rate = 0.0
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def plan(self, items, cost):
+        """Split items into consecutive batches; cost(item) is its estimated token count."""
+        with self.lock:
+            budget = self.token_budget
+
+        batches = []
+        batch = []
+        batch_tokens = 0
+        for item in items:
+            tokens = cost(item)
+            if batch and (batch_tokens + tokens > budget or len(batch) >= self.max_items):
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append(item)
+            batch_tokens += tokens
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def observe(self, tokens, latency, ok):
+        """Record the outcome of one API call and adapt the token budget."""
+        with self.lock:
+            self.calls += 1
+            self.error_rate = 0.8 * self.error_rate + 0.2 * (0.0 if ok else 1.0)
+
+            if not ok:
+                self.token_budget = max(self.min_tokens, self.token_budget / 2)
+                return
+
+            if tokens > 0:
+                sample = latency / tokens
+                self.seconds_per_token = sample if self.seconds_per_token is None else 0.8 * self.seconds_per_token + 0.2 * sample
+                ideal = self.target_latency / self.seconds_per_token if self.seconds_per_token > 0 else self.max_tokens
+                # Grow at most 50% per call, but follow a slowdown immediately
+                ideal = min(ideal, self.token_budget * 1.5)
+                self.token_budget = min(self.max_tokens, max(self.min_tokens, 0.7 * self.token_budget + 0.3 * ideal))
+
+    def timed_call(self, fn, tokens, *args):
+        """Run fn(*args) and feed its latency and outcome back into the planner."""
+        start = time.monotonic()
+        try:
+            result = fn(*args)
+        except Exception:
+            self.observe(tokens, time.monotonic() - start, ok=False)
+            raise
+        self.observe(tokens, time.monotonic() - start, ok=True)
+        return result
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "token_budget": int(self.token_budget),
+                "seconds_per_token": self.seconds_per_token,
+                "error_rate": round(self.error_rate, 4),
+                "calls": self.calls,
+            }
+
+_planners = {}
+_planners_lock = threading.Lock()
+
+def get_planner(name):
+    """Return the process-wide planner for one kind of call ("ocr", "verify", ...)."""
+    with _planners_lock:
+        if name not in _planners:
+            _planners[name] = BatchPlanner(name)
+        return _planners[name]
@@ -0,0 +1,81 @@
+import os
+import json
+import sqlite3
+import hashlib
+import logging
+import threading
+
+# Configure Logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# Record finished pages and crops so a retried or restarted job resumes instead of starting over
+CHECKPOINT_ENABLED = os.getenv("CHECKPOINT_ENABLED", "true").lower() == "true"
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class Checkpoint:
+    """A job's completed units, stored in SQLite next to its other workspace files.
+
+    pages: page number -> crop filenames, recorded once the crops are on disk.
+    results: crop filename -> finished record ({"text", ...}); failed crops are
+    never recorded, so they are retried. The checkpoint is reset whenever
+    the signature (PDF content and extraction mode) changes.
+    """
+
+    def __init__(self, path, signature):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS pages (page_number INTEGER PRIMARY KEY, crops TEXT NOT NULL)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS results (filename TEXT PRIMARY KEY, record TEXT NOT NULL)")
+
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'signature'").fetchone()
+        if row and row[0] != signature:
+            logging.info("Checkpoint belongs to a different PDF or mode; starting over.")
+            self.conn.execute("DELETE FROM pages")
+            self.conn.execute("DELETE FROM results")
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('signature', ?)", (signature,))
+        self.conn.commit()
+
+    @classmethod
+    def for_job(cls, workspace, pdf_path, mode):
+        return cls(workspace.checkpoint_file, f"{file_digest(pdf_path)}:{mode}")
+
+    def pages(self):
+        """(page_number, crop filenames) of the recorded pages, in page order."""
+        with self.lock:
+            rows = self.conn.execute("SELECT page_number, crops FROM pages ORDER BY page_number").fetchall()
+        return [(page_number, json.loads(crops)) for page_number, crops in rows]
+
+    def add_page(self, page_number, filenames):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO pages (page_number, crops) VALUES (?, ?)", (page_number, json.dumps(filenames))
+            )
+            self.conn.commit()
+
+    def results(self):
+        """{filename: record} of every crop finished so far."""
+        with self.lock:
+            rows = self.conn.execute("SELECT filename, record FROM results").fetchall()
+        return {filename: json.loads(record) for filename, record in rows}
+
+    def add_results(self, records):
+        """Record finished crops: an iterable of (filename, record) pairs."""
+        rows = [(filename, json.dumps(record, ensure_ascii=False)) for filename, record in records]
+        if not rows:
+            return
+        with self.lock:
+            self.conn.executemany("INSERT OR REPLACE INTO results (filename, record) VALUES (?, ?)", rows)
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
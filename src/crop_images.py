@@ -0,0 +1,142 @@
+import os
+import re
+import time
+import bisect
+import threading
+from collections import OrderedDict
+from werkzeug.security import safe_join
+from .workspace import Workspace, CROPS_ROOT
+from .image_preprocess import _cv, downscale, ENCODE_PARAMS
+from .metrics import CACHE_REQUESTS
+
+# Crop files do not change once written (every job has its own folder), so browsers may keep them;
+# after max-age they revalidate with their ETag and get a 304
+IMAGE_CACHE_MAX_AGE = int(os.getenv("IMAGE_CACHE_MAX_AGE", str(24 * 3600)))
+IMAGE_PAGE_SIZE = int(os.getenv("IMAGE_PAGE_SIZE", "100"))
+IMAGE_MAX_PAGE_SIZE = 1000
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp")
+
+# Requested thumbnail sizes are rounded up to one of these, so each crop has at most this many cached copies
+THUMBNAIL_SIZES = (64, 128, 256, 512)
+THUMBNAIL_QUALITY = int(os.getenv("THUMBNAIL_QUALITY", "80"))
+THUMBNAIL_MIME_TYPE = "image/webp"
+# Thumbnails of a job's crops live in its workspace (deleted with it); those of loose crops here
+LOOSE_THUMBNAILS_DIR = os.path.join("processed_data", "thumbnails")
+
+LISTING_CACHE_FOLDERS = 256
+LISTING_SETTLE_SECONDS = 1.0  # Folders changed more recently may still be written to; their listings are not cached
+
+def natural_key(name):
+    """Sort key putting page_2_question_10.png after page_2_question_9.png."""
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", name)]
+
+# ------------------- Folder Listings -------------------
+class ListingCache:
+    """Naturally sorted file or folder names per folder, re-read only when the folder's mtime changes.
+
+    A page of a listing then costs one stat() and a bisect instead of a full
+    os.listdir per request.
+    """
+
+    def __init__(self, max_folders=LISTING_CACHE_FOLDERS):
+        self.max_folders = max_folders
+        self.lock = threading.Lock()
+        self.listings = OrderedDict()  # (folder, dirs) -> (mtime_ns, names, keys)
+
+    def entries(self, folder, dirs=False):
+        """(names, sort keys) of the images (or with dirs=True, the subfolders) in folder; None if it is missing."""
+        try:
+            stat = os.stat(folder)
+        except FileNotFoundError:
+            return None
+        with self.lock:
+            cached = self.listings.get((folder, dirs))
+            if cached and cached[0] == stat.st_mtime_ns:
+                self.listings.move_to_end((folder, dirs))
+                return cached[1], cached[2]
+
+        with os.scandir(folder) as scan:
+            if dirs:
+                names = [entry.name for entry in scan if entry.is_dir() and not entry.name.startswith(".")]
+            else:
+                names = [entry.name for entry in scan if entry.is_file() and entry.name.lower().endswith(IMAGE_EXTENSIONS)]
+        names.sort(key=natural_key)
+        keys = [natural_key(name) for name in names]
+
+        if time.time() - stat.st_mtime > LISTING_SETTLE_SECONDS:
+            with self.lock:
+                self.listings[(folder, dirs)] = (stat.st_mtime_ns, names, keys)
+                self.listings.move_to_end((folder, dirs))
+                while len(self.listings) > self.max_folders:
+                    self.listings.popitem(last=False)
+        return names, keys
+
+    def page(self, folder, after=None, limit=IMAGE_PAGE_SIZE, dirs=False):
+        """Up to limit names following after, the total count and the cursor of the next page (None at the end)."""
+        listing = self.entries(folder, dirs)
+        if listing is None:
+            return None
+        names, keys = listing
+        start = bisect.bisect_right(keys, natural_key(after)) if after else 0
+        page = names[start:start + limit]
+        next_after = page[-1] if page and start + limit < len(names) else None
+        return page, len(names), next_after
+
+_listings = ListingCache()
+
+def get_listing_cache():
+    return _listings
+
+def crops_folder(job_id=None):
+    """The crop folder of job_id, or the root holding loose crops and the job folders."""
+    return Workspace(job_id).crops_dir if job_id else CROPS_ROOT
+
+# ------------------- Thumbnails -------------------
+def thumbnail_size(requested):
+    """The smallest cached size that is at least requested (capped at the largest)."""
+    index = bisect.bisect_left(THUMBNAIL_SIZES, requested)
+    return THUMBNAIL_SIZES[min(index, len(THUMBNAIL_SIZES) - 1)]
+
+def thumbnail_path(filename, size):
+    """Where the size thumbnail of the crop at filename (relative to CROPS_ROOT) is cached."""
+    job_id, _, name = filename.rpartition("/")
+    folder = os.path.join(Workspace(job_id).root, "thumbnails") if job_id else LOOSE_THUMBNAILS_DIR
+    return os.path.abspath(os.path.join(folder, str(size), os.path.splitext(name)[0] + ".webp"))
+
+def get_thumbnail(filename, size):
+    """Path of a WebP copy of the crop no larger than size pixels on its longest side, created on first request.
+
+    filename is relative to CROPS_ROOT ("<job_id>/<crop>" or a loose crop);
+    returns None if there is no such crop. A cached thumbnail older than its
+    crop is rebuilt.
+    """
+    source = safe_join(CROPS_ROOT, filename)
+    if source is None or not os.path.isfile(source) or filename.count("/") > 1:
+        return None
+    try:
+        target = thumbnail_path(filename, thumbnail_size(size))
+    except ValueError:  # Not a job folder name
+        return None
+    try:
+        if os.path.getmtime(target) >= os.path.getmtime(source):
+            CACHE_REQUESTS.inc(cache="thumbnail", result="hit")
+            return target
+    except OSError:
+        pass
+    CACHE_REQUESTS.inc(cache="thumbnail", result="miss")
+
+    cv2, _ = _cv()
+    img = cv2.imread(source, cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError(f"Cannot decode image {filename}")
+    ok, buffer = cv2.imencode(".webp", downscale(img, thumbnail_size(size)), ENCODE_PARAMS["webp"](cv2, THUMBNAIL_QUALITY))
+    if not ok:
+        raise ValueError(f"Failed to encode thumbnail of {filename}")
+
+    # Write then rename, so concurrent requests never serve a half-written file
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    partial = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(partial, "wb") as f:
+        f.write(buffer.tobytes())
+    os.replace(partial, target)
+    return target
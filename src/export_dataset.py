@@ -0,0 +1,212 @@
+import os
+import sys
+import json
+import base64
+import sqlite3
+import hashlib
+import logging
+import argparse
+import tempfile
+from urllib.parse import urlparse, unquote
+from .submission_store import get_submission_store
+from .workspace import CROPS_ROOT
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Optional: only needed for --format parquet
+    pa = pq = None
+
+# Configure Logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+EXPORT_SHARD_SIZE = int(os.getenv("EXPORT_SHARD_SIZE", "10000"))  # Records per output file
+PARQUET_ROW_GROUP_SIZE = 256  # Rows buffered before a Parquet row group is written
+EXPORT_FORMATS = ("jsonl", "parquet")
+IMAGE_MODES = ("reference", "inline")
+
+# ------------------- Image Lookup -------------------
+# Crops have been served as /static/cropped_questions/<path>, /extract/extract/images/<path> and /image/<name>
+URL_PREFIXES = ("cropped_questions/", "/images/", "/image/")
+
+def resolve_image_path(image_url, crops_root=CROPS_ROOT):
+    """Local file of the crop an image URL points to, or None if it is gone.
+
+    A job's crop (<job_id>/<name>) only resolves inside that job's folder:
+    once the job is garbage collected its records count as missing instead
+    of being paired with a loose crop that happens to share the name.
+    """
+    path = unquote(urlparse(image_url).path)
+    candidates = [path.split(prefix, 1)[1] for prefix in URL_PREFIXES if prefix in path]
+    if not any("/" in candidate for candidate in candidates):
+        candidates.append(os.path.basename(path))
+    root = os.path.realpath(crops_root)
+    for candidate in candidates:
+        full_path = os.path.realpath(os.path.join(root, candidate))
+        if full_path.startswith(root + os.sep) and os.path.isfile(full_path):
+            return full_path
+    return None
+
+class SeenHashes:
+    """Image hashes already exported, kept in a temporary SQLite file instead of memory."""
+
+    def __init__(self):
+        self.tmp = tempfile.NamedTemporaryFile(suffix=".sqlite3", delete=False)
+        self.tmp.close()
+        self.conn = sqlite3.connect(self.tmp.name)
+        self.conn.execute("PRAGMA journal_mode=OFF")
+        self.conn.execute("PRAGMA synchronous=OFF")
+        self.conn.execute("CREATE TABLE seen (hash TEXT PRIMARY KEY)")
+
+    def add(self, digest):
+        """True if digest had not been seen before."""
+        return self.conn.execute("INSERT OR IGNORE INTO seen (hash) VALUES (?)", (digest,)).rowcount == 1
+
+    def close(self):
+        self.conn.close()
+        os.remove(self.tmp.name)
+
+# ------------------- Shard Writers -------------------
+class ShardWriter:
+    """Writes records to <prefix>-00000.<ext>, <prefix>-00001.<ext>, ... with shard_size records per file."""
+
+    extension = None
+
+    def __init__(self, out_dir, shard_size, prefix="data"):
+        self.out_dir = out_dir
+        self.shard_size = shard_size
+        self.prefix = prefix
+        self.shards = []
+        self.count = 0  # Records in the current shard
+
+    def write(self, record):
+        if not self.shards or self.count >= self.shard_size:
+            if self.shards:
+                self._close_shard()
+            self.shards.append(os.path.join(self.out_dir, f"{self.prefix}-{len(self.shards):05d}.{self.extension}"))
+            self._open_shard(self.shards[-1])
+            self.count = 0
+        self._write(record)
+        self.count += 1
+
+    def close(self):
+        if self.shards:
+            self._close_shard()
+
+class JSONLShardWriter(ShardWriter):
+    extension = "jsonl"
+
+    def _open_shard(self, path):
+        self.file = open(path, "w", encoding="utf-8")
+
+    def _write(self, record):
+        if isinstance(record.get("image"), bytes):
+            record = {**record, "image": base64.b64encode(record["image"]).decode("ascii")}
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def _close_shard(self):
+        self.file.close()
+
+class ParquetShardWriter(ShardWriter):
+    extension = "parquet"
+
+    def __init__(self, out_dir, shard_size, prefix="data"):
+        if pa is None:
+            raise RuntimeError("Parquet export needs pyarrow: pip install pyarrow")
+        super().__init__(out_dir, shard_size, prefix)
+        self.schema = pa.schema([
+            ("image_sha256", pa.string()), ("text", pa.string()), ("image_url", pa.string()),
+            ("image_path", pa.string()), ("image", pa.binary()), ("job_id", pa.string()),
+            ("submission_id", pa.string()), ("verification", pa.string()), ("submitted_at", pa.float64()),
+        ])
+
+    def _open_shard(self, path):
+        self.writer = pq.ParquetWriter(path, self.schema)
+        self.rows = []
+
+    def _write(self, record):
+        self.rows.append(record)
+        if len(self.rows) >= PARQUET_ROW_GROUP_SIZE:
+            self._flush()
+
+    def _flush(self):
+        if self.rows:
+            self.writer.write_table(pa.Table.from_pylist(self.rows, schema=self.schema))
+            self.rows = []
+
+    def _close_shard(self):
+        self._flush()
+        self.writer.close()
+
+WRITERS = {"jsonl": JSONLShardWriter, "parquet": ParquetShardWriter}
+
+# ------------------- Export -------------------
+def export_dataset(out_dir, fmt="jsonl", images="reference", shard_size=EXPORT_SHARD_SIZE, store=None, crops_root=CROPS_ROOT):
+    """Export (crop image, final submitted text) pairs as sharded JSONL or Parquet.
+
+    Every image URL contributes its most recent submission; images with the
+    same content are exported once, newest text first. images="inline" embeds
+    the crop bytes (base64 in JSONL), "reference" stores its path. Records
+    stream from the store page by page and seen hashes live on disk, so
+    memory stays constant. Writes manifest.json and returns its stats.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown format: {fmt}")
+    if images not in IMAGE_MODES:
+        raise ValueError(f"Unknown image mode: {images}")
+    store = store or get_submission_store()
+    os.makedirs(out_dir, exist_ok=True)
+
+    writer = WRITERS[fmt](out_dir, shard_size)
+    seen = SeenHashes()
+    stats = {"exported": 0, "duplicates": 0, "missing_images": 0}
+    try:
+        for submission in store.iter_latest():
+            image_path = resolve_image_path(submission["image_url"], crops_root)
+            if image_path is None:
+                stats["missing_images"] += 1
+                continue
+            with open(image_path, "rb") as f:
+                data = f.read()
+            digest = hashlib.sha256(data).hexdigest()
+            if not seen.add(digest):
+                stats["duplicates"] += 1
+                continue
+
+            writer.write({
+                "image_sha256": digest,
+                "text": submission["text"],
+                "image_url": submission["image_url"],
+                "image_path": os.path.relpath(image_path, crops_root) if images == "reference" else None,
+                "image": data if images == "inline" else None,
+                "job_id": submission["job_id"],
+                "submission_id": submission["submission_id"],
+                "verification": submission["verification"],
+                "submitted_at": submission["created_at"],
+            })
+            stats["exported"] += 1
+    finally:
+        writer.close()
+        seen.close()
+
+    manifest = {
+        "format": fmt, "images": images, "images_root": os.path.abspath(crops_root),
+        "shards": [os.path.basename(path) for path in writer.shards], **stats,
+    }
+    with open(os.path.join(out_dir, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    logging.info(f"Exported {stats['exported']} pairs to {len(writer.shards)} shards in {out_dir} "
+                 f"({stats['duplicates']} duplicates, {stats['missing_images']} missing images).")
+    return manifest
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export submitted OCR corrections as a training dataset.")
+    parser.add_argument("out_dir")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="jsonl")
+    parser.add_argument("--images", choices=IMAGE_MODES, default="reference")
+    parser.add_argument("--shard-size", type=int, default=EXPORT_SHARD_SIZE)
+    args = parser.parse_args()
+    try:
+        export_dataset(args.out_dir, args.format, args.images, args.shard_size)
+    except (RuntimeError, ValueError) as e:
+        sys.exit(str(e))
@@ -1,96 +1,161 @@
 import os
-import time
 import logging
-from flask import Flask, jsonify,Blueprint
+import threading
+import unicodedata
+from flask import Flask, jsonify,Blueprint, request
 from flask_cors import CORS
-import google.generativeai as genai
-from dotenv import load_dotenv
+from cachetools import TTLCache
+from .model_client import get_model
+from .gemini_scheduler import get_scheduler, estimate_tokens
+from .workspace import Workspace, any_workspaces
+from .structured_output import items_config, parse_items, resolve_batch
+from .batch_planner import get_planner, text_tokens
+from .metrics import CACHE_REQUESTS, timed
 
 verify_bp = Blueprint("verify", __name__)
 #CORS(verify_bp,resources={r"/*": {"origins": "*"}})
 # Configure Logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
-# Load API Key from .env file
-load_dotenv()
-API_KEY = os.getenv("GOOGLE_API_KEY")
-
-if not API_KEY:
-    raise ValueError("API key not found. Set GOOGLE_API_KEY in the environment variables.")
-
-# Configure Google Gemini API
-genai.configure(api_key=API_KEY)
-model = genai.GenerativeModel("gemini-2.0-flash")
-
-
-
-# Directory containing the extracted text file
+# Legacy single-tenant text file, used only when no job workspace exists
 TEXT_DIR = "processed_data"
 TEXT_FILE = os.path.join(TEXT_DIR, "extracted_text.txt")
 
-BATCH_SIZE = 10  # Process 10 texts at a time
+# Verdicts are keyed by text ID in a JSON answer, so batches can be large without shifting results.
+# 0 packs batches by estimated tokens with the adaptive planner; N forces N texts per call.
+BATCH_SIZE = int(os.getenv("VERIFY_BATCH_SIZE", "0"))
 
-def verify_japanese_text(text_data):
-    """Checks if Japanese text has correct meaning using Gemini AI in batches."""
-    verified_results = []
-    total_texts = len(text_data)
-
-    for i in range(0, total_texts, BATCH_SIZE):
-        batch = text_data[i:i + BATCH_SIZE]  # Take 10 texts at a time
-        prompt_texts = [f"{j+1}. {text}" for j, text in enumerate(batch) if text.strip()]  # Numbered input
-
-        if not prompt_texts:
-            continue  # Skip empty batches
-
-        # Structured Gemini AI prompt
-        prompt = (
-    "Evaluate the accuracy of the following extracted Japanese texts based on spelling, grammar, and meaning.\n"
+# Bump VERIFY_PROMPT_VERSION whenever VERIFY_PROMPT changes so cached verdicts are not reused
+VERIFY_PROMPT_VERSION = "2"
+# Grading rules, shared with the fused extract-and-verify prompt
+VERIFY_CRITERIA = (
     "If at least 80% of the text is correct and the errors are minor (such as small typos, spacing, or minor variations), mark it as 'Correct'.\n"
     "Only mark it as 'Incorrect' if the errors significantly affect readability, meaning, or context.\n"
-    "Respond strictly in the following format (one line per text, only 'Correct' or 'Incorrect'):\n"
     "Known-Correct References example :としもんだい ,アジア NISE , 1989年1月7日 ,季節風(モンスーン), 季節風(モンスーン) ,世界の屋根. \n"
-    "1. Correct\n"
-    "2. Incorrect\n"
-    "3. Correct\n"
-    "...\n\n"
-    + "\n".join(prompt_texts)
 )
-
-
-        try:
-            response = model.generate_content(prompt)
-
-            if not response.text:
-                logging.error("AI returned an empty response.")
-                results = ["AI Error"] * len(batch)
-            else:
-                results = response.text.strip().split("\n")
-
-            # Ensure correct mapping between input and response
-            verified_batch = []
-            for j, text in enumerate(batch):
-                verification = results[j].split(".")[-1].strip() if j < len(results) else "AI Error"
-                verified_batch.append({"text": text, "verification": verification})
-
-            verified_results.extend(verified_batch)
-
-        except Exception as e:
-            logging.error(f"AI processing error: {e}")
-            verified_results.extend([{"text": text, "verification": "AI Processing Failed"} for text in batch])
-
-        time.sleep(2)  # Prevent hitting API limits
+VERIFY_PROMPT = (
+    "Evaluate the accuracy of the following extracted Japanese texts based on spelling, grammar, and meaning.\n"
+    + VERIFY_CRITERIA +
+    "Each text is given as 'ID: text'. Respond with a JSON array containing one object per text, "
+    "with the text's \"id\" and a \"verdict\" of either 'Correct' or 'Incorrect'.\n\n"
+)
+VERDICTS = ("Correct", "Incorrect")
+VERIFY_RESPONSE_CONFIG = items_config("verdict", enum=VERDICTS)
+
+# Verdict cache: normalized text + prompt version -> verification
+VERIFY_CACHE_TTL = int(os.getenv("VERIFY_CACHE_TTL", "3600"))
+VERIFY_CACHE_MAXSIZE = int(os.getenv("VERIFY_CACHE_MAXSIZE", "10000"))
+verify_cache = TTLCache(maxsize=VERIFY_CACHE_MAXSIZE, ttl=VERIFY_CACHE_TTL)
+verify_cache_lock = threading.Lock()
+
+def normalize_text(text):
+    """Normalize width variants and whitespace so equivalent texts share a cache entry."""
+    return " ".join(unicodedata.normalize("NFKC", text).split())
+
+def _generate_verdicts(items):
+    """Ask Gemini for verdicts of (text_id, text) items; returns {text_id: verdict}."""
+    prompt = VERIFY_PROMPT + "\n".join(f"{text_id}: {text}" for text_id, text in items)
+    response = get_model().generate_content(prompt, generation_config=VERIFY_RESPONSE_CONFIG)
+    if not response.text:
+        logging.error("AI returned an empty response.")
+    return parse_items(response.text, [text_id for text_id, _ in items], "verdict", allowed=VERDICTS)
+
+def _submit_verify_batch(scheduler, items, trace=None):
+    tokens = estimate_tokens(VERIFY_PROMPT, [text for _, text in items])
+    return scheduler.submit(get_planner("verify").timed_call, _generate_verdicts, tokens, items, tokens=tokens, trace=trace)
+
+def verify_japanese_text(text_data, metrics=None, trace=None):
+    """Checks if Japanese text has correct meaning using Gemini AI in batches.
+
+    Verdicts are memoized per normalized text and prompt version, so only
+    texts not seen within VERIFY_CACHE_TTL are sent to Gemini. Batches run
+    concurrently through the shared scheduler, which handles rate limits and
+    retries. Verdicts come back keyed by text ID and texts missing from an
+    answer are re-requested; results keep the input order and say whether
+    they were cached. Unless VERIFY_BATCH_SIZE is set, batches are packed by
+    the adaptive "verify" planner and their sizes are added to metrics.
+    The whole run is timed as the "verify" stage (and traced if trace is given).
+    """
+    with timed("verify", trace, texts=len(text_data)):
+        return _verify_japanese_text(text_data, metrics, trace)
+
+def _verify_japanese_text(text_data, metrics=None, trace=None):
+    verified_results = []
+    uncached = []  # Unique normalized texts that need a Gemini call
+    seen = set()
+
+    for text in text_data:
+        key = (normalize_text(text), VERIFY_PROMPT_VERSION)
+        with verify_cache_lock:
+            verification = verify_cache.get(key)
+        verified_results.append({"text": text, "verification": verification, "cached": verification is not None})
+        CACHE_REQUESTS.inc(cache="verify", result="miss" if verification is None else "hit")
+        if verification is None and key[0] and key[0] not in seen:
+            seen.add(key[0])
+            uncached.append(key[0])
+
+    scheduler = get_scheduler()
+    pending = []
+
+    planner = get_planner("verify")
+    if BATCH_SIZE:
+        batches = [uncached[i:i + BATCH_SIZE] for i in range(0, len(uncached), BATCH_SIZE)]
+    else:
+        batches = planner.plan(uncached, text_tokens)
+    if metrics is not None:
+        metrics["verify_batch_sizes"] = [len(batch) for batch in batches]
+
+    offset = 0
+    for batch in batches:
+        items = {f"t{offset + j + 1}": text for j, text in enumerate(batch)}  # IDed input
+        offset += len(batch)
+        pending.append((items, _submit_verify_batch(scheduler, list(items.items()), trace)))
+
+    verdicts = {}
+    for items, future in pending:
+        resubmit = lambda ids, items=items: _submit_verify_batch(scheduler, [(text_id, items[text_id]) for text_id in ids], trace)
+        results, error = resolve_batch(future, list(items), resubmit)
+        if error:
+            logging.error(f"AI processing error: {error}")
+
+        for text_id, text in items.items():
+            verification = results.get(text_id, "AI Processing Failed" if error else "AI Error")
+            verdicts[text] = verification
+            if verification in VERDICTS:
+                with verify_cache_lock:
+                    verify_cache[(text, VERIFY_PROMPT_VERSION)] = verification
+
+    if metrics is not None:
+        metrics["verify_planner"] = planner.snapshot()
+
+    for result in verified_results:
+        if result["verification"] is None:
+            result["verification"] = verdicts.get(normalize_text(result["text"]), "AI Error")
 
     return verified_results
 
 
 @verify_bp.route("/verify-japanese", methods=["GET"])
 def verify_text():
-    """API endpoint to read extracted_text.txt and verify Japanese text."""
-    if not os.path.exists(TEXT_FILE):
+    """API endpoint to read a job's extracted_text.txt and verify Japanese text.
+
+    ?job_id= selects the job. It is required once job workspaces exist, so a
+    client never grades another client's job; without any, the legacy shared
+    extracted_text.txt is read.
+    """
+    job_id = request.args.get("job_id")
+    if not job_id and any_workspaces():
+        return jsonify({"error": "job_id is required"}), 400
+    try:
+        text_file = Workspace(job_id).text_file if job_id else TEXT_FILE
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if not os.path.exists(text_file):
         return jsonify({"error": "extracted_text.txt not found"}), 404
 
     try:
-        with open(TEXT_FILE, "r", encoding="utf-8") as f:
+        with open(text_file, "r", encoding="utf-8") as f:
             lines = f.readlines()
 
         # Filter out lines that start with "Image:" and keep only actual text
@@ -99,8 +164,15 @@ def verify_text():
         if not text_data:
             return jsonify({"error": "No valid text found in file"}), 400
 
-        verification_results = verify_japanese_text(text_data)
-        return jsonify({"status": "success", "results": verification_results})
+        metrics = {}
+        verification_results = verify_japanese_text(text_data, metrics=metrics)
+        cache_hits = sum(1 for result in verification_results if result["cached"])
+        return jsonify({
+            "status": "success",
+            "results": verification_results,
+            "cache": {"hits": cache_hits, "misses": len(verification_results) - cache_hits},
+            "metrics": metrics,
+        })
 
     except Exception as e:
         logging.error(f"Error processing request: {e}")
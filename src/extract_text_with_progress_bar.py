@@ -1,17 +1,31 @@
 import os
-import re
+import json
 import time
+import uuid
+import queue
 import logging
-from flask import Flask,Blueprint, request, jsonify, send_from_directory
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from flask import Blueprint, request, jsonify, send_from_directory, send_file, Response
 #from flask_cors import CORS
-from dotenv import load_dotenv
-import PIL.Image
-import cv2
-import numpy as np
-import google.generativeai as genai
-from pdf2image import convert_from_path
-from flask_socketio import emit
-from .socket_config import socketio 
+from .model_client import get_model, GEMINI_MODEL
+from .gemini_scheduler import get_scheduler, estimate_tokens
+from .ocr_cache import get_ocr_cache
+from .jobs import JobQueue, QueueFullError
+from .workspace import Workspace, WorkspaceExistsError, collect_garbage_soon, CLIENT_JOB_ID_PATTERN
+from .progress import ProgressReporter
+from .structured_output import items_config, records_config, parse_items, parse_records, resolve_batch
+from .batch_planner import get_planner, crop_tokens
+from .image_preprocess import preprocess_signature, upload_part
+from .ocr_backends import get_local_backend, needs_escalation, OCR_BACKEND
+from .pipeline import Pipeline
+from .checkpoint import Checkpoint, CHECKPOINT_ENABLED
+from .extract_text_recheck import VERIFY_CRITERIA, VERDICTS, verify_japanese_text
+from .metrics import Trace, timed_iter, CROPS, UPLOAD_BYTES, UPLOAD_BYTES_SAVED
+from .crop_images import (
+    get_listing_cache, crops_folder, get_thumbnail, IMAGE_CACHE_MAX_AGE, IMAGE_PAGE_SIZE, IMAGE_MAX_PAGE_SIZE, THUMBNAIL_MIME_TYPE,
+)
 
 extract_bp = Blueprint("extract", __name__)
 # 
@@ -20,205 +34,791 @@ extract_bp = Blueprint("extract", __name__)
 # Configure Logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
-# Load API Key from .env file
-load_dotenv()
-API_KEY = os.getenv("GOOGLE_API_KEY")
+# .env is loaded by model_client; the Gemini client itself is created on first use (get_model)
 BACKEND_API = os.getenv("BACKEND_API")
 
-if not API_KEY:
-    raise ValueError("API key not found. Set GOOGLE_API_KEY in the environment variables.")
-
-# Configure Google Gemini API
-genai.configure(api_key=API_KEY)
-model = genai.GenerativeModel("gemini-2.0-flash")
+# pdf2image, OpenCV and the segmentation module are imported where they are
+# used, so importing the app (or a worker that only serves requests) stays fast
 
 
 
 # Output folders
 BASE_DIR = "processed_data"
-PDF_IMAGES_DIR = os.path.join(BASE_DIR, "pdf_images")  # Folder for PDF images
 CROPPED_DIR = os.path.join(os.getcwd(), "static", "cropped_questions")# Public folder for question images
 
 os.makedirs(BASE_DIR, exist_ok=True)
-os.makedirs(PDF_IMAGES_DIR, exist_ok=True)
 os.makedirs(CROPPED_DIR, exist_ok=True)
 
-def send_progress(step, percentage):
-    """Emit real-time progress updates via WebSockets."""
-    if socketio:
-        print(f"📡 Emitting Progress: Step: {step}, Percentage: {percentage}")  # Debug log
-        socketio.emit("progress", {"step": step, "progress_percent": percentage})
-        socketio.sleep(1)
-    else:
-        print("❌ Error: SocketIO is None!")
+# Number of pages rendered per convert_from_path call; bounds peak memory per request
+PDF_PAGE_CHUNK_SIZE = int(os.getenv("PDF_PAGE_CHUNK_SIZE", "4"))
+PDF_DPI = int(os.getenv("PDF_DPI", "200"))
 
+# Crops are handed to the model in memory; PNGs on disk only back the image-serving endpoints.
+# Each job writes into its own Workspace (processed_data/jobs/<id>, static/cropped_questions/<id>).
+PERSIST_CROPS = os.getenv("PERSIST_CROPS", "true").lower() == "true"
+PERSIST_PAGES = os.getenv("PERSIST_PAGES", "false").lower() == "true"
+_crop_writer = ThreadPoolExecutor(max_workers=2, thread_name_prefix="crop-writer")
 
-    
 # ------------------- Step 1: Convert PDF to Images -------------------
-def pdf_to_images(pdf_path):
-    """Convert PDF pages to images and save them in pdf_images/."""
-    os.makedirs(PDF_IMAGES_DIR, exist_ok=True)  # Ensure directory exists
-    send_progress("Converting PDF to Images...", 10)
-    images = convert_from_path(pdf_path)
-    image_paths = []
-
-    for i, img in enumerate(images):
-        image_path = os.path.join(PDF_IMAGES_DIR, f"page_{i+1}.png")
-        img.save(image_path, "PNG")
-        image_paths.append(image_path)
-
-    logging.info(f"PDF converted to {len(image_paths)} images.")
-    send_progress("PDF Conversion Completed", 30)
-    return image_paths
+def count_pdf_pages(pdf_path):
+    from pdf2image import pdfinfo_from_path
+    return pdfinfo_from_path(pdf_path)["Pages"]
+
+def iter_pdf_pages(pdf_path, chunk_size=PDF_PAGE_CHUNK_SIZE, page_count=None, start_page=1):
+    """Yield (page_number, PIL image) pairs from start_page on, rendering at most chunk_size pages at a time."""
+    from pdf2image import convert_from_path
+    page_count = page_count or count_pdf_pages(pdf_path)
+
+    for first_page in range(start_page, page_count + 1, chunk_size):
+        last_page = min(first_page + chunk_size - 1, page_count)
+        pages = convert_from_path(pdf_path, dpi=PDF_DPI, first_page=first_page, last_page=last_page)
+
+        for offset, page in enumerate(pages):
+            yield first_page + offset, page
+        del pages  # Release the window before rendering the next one
 
 # ------------------- Step 2: Extract Questions from Images -------------------
-def extract_questions(image_path):
-    """Extract question regions from an image using OpenCV contour detection."""
-    img = cv2.imread(image_path)
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
-    _, thresh = cv2.threshold(blurred, 150, 255, cv2.THRESH_BINARY_INV)
-
-    # Find contours
-    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-    question_images = []
-    for contour in contours:
-        x, y, w, h = cv2.boundingRect(contour)
-        
-        # Filter out small noise
-        if w > 100 and h > 50:
-            question_img = img[y:y+h, x:x+w]
-            question_images.append(question_img)
-
-    return question_images
-
-def save_cropped_questions(image_paths):
-    """Process images and save extracted questions in static/cropped_questions/."""
-    send_progress("Extracting Questions from Images...", 50)
-    cropped_image_filenames = []
-
-    for i, image_path in enumerate(image_paths):
-        questions = extract_questions(image_path)
-
-        for j, q_img in enumerate(questions):
-            cropped_filename = f"question_{i+1}_{j+1}.png"
-            cropped_path = os.path.join(CROPPED_DIR, cropped_filename)
-            cv2.imwrite(cropped_path, q_img)
-            
-            # Store filename for serving images dynamically
-            cropped_image_filenames.append(cropped_filename)
-
-    logging.info(f"Saved {len(cropped_image_filenames)} cropped questions.")
-    send_progress("Question Extraction Completed", 70)
-    return cropped_image_filenames
+def _write_crop(crops_dir, crop):
+    with open(os.path.join(crops_dir, crop["filename"]), "wb") as f:
+        f.write(crop["data"])
+
+def _log_write_error(filename, future):
+    if future.exception():
+        logging.error(f"Failed to save crop {filename}: {future.exception()}")
+
+def persist_crops(crops, workspace, force=False):
+    """Write already-encoded crops to the job's static/cropped_questions/<job_id>/ in the background.
+
+    Returns the write futures; force writes them even if PERSIST_CROPS is off (for checkpoints).
+    Failed writes are logged even if nobody waits for them.
+    """
+    if not (PERSIST_CROPS or force):
+        return []
+    writes = []
+    for crop in crops:
+        write = _crop_writer.submit(_write_crop, workspace.crops_dir, crop)
+        write.add_done_callback(lambda future, filename=crop["filename"]: _log_write_error(filename, future))
+        writes.append(write)
+    return writes
+
+def page_to_bgr(page_number, page, workspace):
+    """Convert a rendered PIL page to the BGR array segmentation expects, saving it first if PERSIST_PAGES."""
+    import cv2
+    import numpy as np
+    if PERSIST_PAGES:
+        os.makedirs(workspace.pages_dir, exist_ok=True)
+        page.save(os.path.join(workspace.pages_dir, f"page_{page_number}.png"), "PNG")
+    img = cv2.cvtColor(np.asarray(page.convert("RGB")), cv2.COLOR_RGB2BGR)
+    page.close()
+    return img
+
+def stream_cropped_questions(pdf_path, workspace, progress=None, trace=None, wait_for_writes=False):
+    """Rasterize the PDF window by window and crop each page as soon as it is rendered.
+
+    Only PDF_PAGE_CHUNK_SIZE pages are held in memory at once, so peak memory
+    no longer grows with the page count. Pages are segmented in the process pool
+    straight from memory and never round-trip through a PNG file.
+    wait_for_writes returns only once the crops are on disk.
+    """
+    from .segmentation import segment_pages
+    progress = progress or ProgressReporter(workspace.job_id)
+    page_count = count_pdf_pages(pdf_path)
+    pages_done = 0
+    progress.stage("Converting PDF and Extracting Questions...", 10, 70)
+
+    def rendered_pages():
+        for page_number, page in timed_iter(iter_pdf_pages(pdf_path, page_count=page_count), "rasterize", trace):
+            yield page_number, page_to_bgr(page_number, page, workspace)
+
+    def on_page(page_number, page_crops):
+        nonlocal pages_done
+        pages_done += 1
+        progress.advance(pages_done, page_count, "pages")
+
+    crops = segment_pages(rendered_pages(), on_page=on_page, trace=trace)
+    writes = persist_crops(crops, workspace)
+    if wait_for_writes:
+        wait(writes)
+
+    logging.info(f"Processed {page_count} pages, extracted {len(crops)} cropped questions.")
+    progress.stage("Question Extraction Completed", 70)
+    return crops
 
 # ------------------- Step 3: Extract Text Using Gemini AI -------------------
-def extract_text_from_images(image_filenames, batch_size=10):
-    """Extract handwritten text from cropped images using Gemini AI in batches."""
-    send_progress("Extracting Text from Images...", 80)
-    extracted_data = []
-    os.makedirs(BASE_DIR, exist_ok=True)  # Ensure the directory exists
-    text_file_path = os.path.join(BASE_DIR, "extracted_text.txt")
-
-    with open(text_file_path, "w", encoding="utf-8") as text_file:
-        for i in range(0, len(image_filenames), batch_size):
-            batch = image_filenames[i:i + batch_size]
-            images = []
-
-            for filename in batch:
-                try:
-                    image_path = os.path.join(CROPPED_DIR, filename)
-                    image = PIL.Image.open(image_path).convert("RGB")
-                    images.append(image)
-                except Exception as e:
-                    extracted_data.append({"image_url": f"{BACKEND_API}/static/cropped_questions/{filename}", "text": f"❌ Error: {str(e)}"})
-                    continue
+def load_crop(filename, workspace):
+    """Load a previously saved crop of the job as an image part."""
+    with open(os.path.join(workspace.crops_dir, filename), "rb") as f:
+        return {"filename": filename, "mime_type": "image/png", "data": f.read()}
+
+OCR_PROMPT = (
+    "Convert the handwriting to text for each image. If needed, correct mistakes based on context. "
+    "Each image is preceded by its ID. Respond with a JSON array containing one object per image, "
+    "with the image's \"id\" and its extracted \"text\" only. Keep line breaks inside \"text\"."
+)
+OCR_RESPONSE_CONFIG = items_config("text")
+
+# Fused mode: transcription and grading verdict in the same call, instead of a second /verify pass
+FUSED_PROMPT = (
+    "Convert the handwriting to text for each image. If needed, correct mistakes based on context. "
+    "Then evaluate the accuracy of the extracted Japanese text based on spelling, grammar, and meaning.\n"
+    + VERIFY_CRITERIA +
+    "Each image is preceded by its ID. Respond with a JSON array containing one object per image, "
+    "with the image's \"id\", its extracted \"text\" and a \"verdict\" of either 'Correct' or 'Incorrect'. "
+    "Keep line breaks inside \"text\"."
+)
+FUSED_FIELDS = {"text": None, "verdict": VERDICTS}
+FUSED_RESPONSE_CONFIG = records_config(FUSED_FIELDS)
+FUSED_VERIFY = os.getenv("FUSED_VERIFY", "false").lower() == "true"  # Default when a request does not say
+# Verdict of crops read with OCR_BACKEND=local, which never sends them to Gemini for grading
+UNVERIFIED = "Unverified (local OCR)"
+
+# Structured answers are keyed by image ID, so large batches no longer risk shifted results.
+# 0 packs batches by estimated image tokens with the adaptive planner; N forces N crops per call.
+OCR_BATCH_SIZE = int(os.getenv("OCR_BATCH_SIZE", "0"))
+
+def _generate_batch_text(items, verify=False):
+    """Ask Gemini for the text of (image_id, image) items; returns {image_id: text}.
+
+    With verify, returns {image_id: {"text", "verdict"}} from the fused prompt.
+    """
+    parts = [FUSED_PROMPT if verify else OCR_PROMPT]
+    for image_id, image in items:
+        parts.extend([f"Image ID: {image_id}", image])
+    ids = [image_id for image_id, _ in items]
+    if verify:
+        response = get_model().generate_content(parts, generation_config=FUSED_RESPONSE_CONFIG)
+        return parse_records(response.text, ids, FUSED_FIELDS)
+    response = get_model().generate_content(parts, generation_config=OCR_RESPONSE_CONFIG)
+    return parse_items(response.text, ids, "text")
+
+def _submit_ocr_batch(scheduler, items, verify=False, trace=None):
+    tokens = estimate_tokens(FUSED_PROMPT if verify else OCR_PROMPT, [image for _, image in items])
+    planner = get_planner("fused" if verify else "ocr")
+    return scheduler.submit(planner.timed_call, _generate_batch_text, tokens, items, verify, tokens=tokens, trace=trace)
+
+def _record(workspace, entry):
+    record = {"image_url": f"{BACKEND_API}/static/cropped_questions/{workspace.job_id}/{entry['filename']}", "text": entry["text"]}
+    if "verification" in entry:
+        record["verification"] = entry["verification"]
+    return record
+
+class OCRRun:
+    """Text extraction for one job: add() crops as they are segmented, then finish() for the records.
+
+    Each crop is answered from the checkpoint, the OCR cache, the local OCR
+    backend or Gemini, in that order; on_result gets finished records as
+    soon as they are available.
+    """
+
+    def __init__(self, workspace, batch_size=None, on_result=None, progress=None, metrics=None, verify=False, checkpoint=None, trace=None):
+        self.workspace = workspace
+        self.verify = verify  # Gemini grades each crop along with its text (FUSED_PROMPT), no second /verify pass
+        self.prompt = FUSED_PROMPT if verify else OCR_PROMPT
+        self.batch_size = batch_size or OCR_BATCH_SIZE
+        self.on_result = on_result
+        self.progress = progress or ProgressReporter(workspace.job_id)
+        self.metrics = metrics
+        self.checkpoint = checkpoint
+        self.trace = trace
+        self.restored = checkpoint.results() if checkpoint else {}
+        self.planner = get_planner("fused" if verify else "ocr")
+        self.cache = get_ocr_cache()
+        self.scheduler = get_scheduler()
+        self.local = get_local_backend()
+        self.entries = []
+        self.queued = []
+        self.pending = deque()
+        self.batch_sizes = []
+        self.sources = {"checkpoint": 0, "cache": 0, "local": 0, "gemini": 0}
+        self.original_bytes = 0
+        self.upload_bytes = 0
+
+    def _publish(self, entries):
+        """Hand finished entries to on_result and record the successful ones in the checkpoint."""
+        if not entries:
+            return
+        if self.on_result:
+            self.on_result([_record(self.workspace, entry) for entry in entries])
+        if self.checkpoint:
+            self.checkpoint.add_results(
+                (entry["filename"], {field: entry[field] for field in ("text", "verification") if field in entry})
+                for entry in entries
+                if entry["ok"] and entry["filename"] not in self.restored
+            )
 
-            if not images:
-                continue
+    def add(self, crops):
+        """Answer crops from the checkpoint, the cache or locally, and submit the rest to Gemini right away.
 
-            prompt = (
-                "Convert the handwriting to text for each image. If needed, correct mistakes based on context. "
-                "Respond with extracted text only, maintaining the order of images."
-            )
+        crops are the in-memory parts from segmentation; filenames in the job's crop folder are read from disk.
+        """
+        first = len(self.entries)
+        misses = []
 
+        for crop in crops:
             try:
-                response = model.generate_content([prompt] + images)
-                texts = response.text.strip().split("\n") if response.text else []
-
-                for j, filename in enumerate(batch):
-                    extracted_text = texts[j] if j < len(texts) else "No text detected"
-                    extracted_data.append({"image_url": f"{BACKEND_API}/static/cropped_questions/{filename}", "text": extracted_text})
-                    
+                filename = crop if isinstance(crop, str) else crop["filename"]
+                if filename in self.restored:
+                    entry = {"id": f"img{len(self.entries) + 1}", "filename": filename, "ok": True, **self.restored[filename]}
+                    self.sources["checkpoint"] += 1
+                    CROPS.inc(source="checkpoint")
+                    self.entries.append(entry)
+                    continue
+                if isinstance(crop, str):
+                    crop = load_crop(crop, self.workspace)
+                key = self.cache.make_key(crop["data"], self.prompt + preprocess_signature(), GEMINI_MODEL)
+                entry = {"id": f"img{len(self.entries) + 1}", "filename": crop["filename"], "key": key, "text": self.cache.get(key), "ok": True}
+                if entry["text"] is None:
+                    misses.append((entry, crop))
+                else:
+                    self.sources["cache"] += 1
+                    CROPS.inc(source="cache")
+                    if self.verify:
+                        cached = json.loads(entry["text"])  # Fused answers are cached as {"text", "verdict"}
+                        entry["text"], entry["verification"] = cached["text"], cached["verdict"]
+            except Exception as e:
+                entry = {"filename": crop, "text": f"❌ Error: {str(e)}", "ok": False}
+            self.entries.append(entry)
+
+        self._publish([entry for entry in self.entries[first:] if entry["text"] is not None])
+
+        # Read misses locally first; only those under OCR_CONFIDENCE_THRESHOLD go on to Gemini
+        if self.local and misses:
+            start = time.monotonic()
+            results = self.local.recognize_many([crop for _, crop in misses])
+            escalated = []
+            for (entry, crop), result in zip(misses, results):
+                if needs_escalation(result):
+                    escalated.append((entry, crop))
+                else:
+                    entry["text"] = result["text"] or "No text detected"
+            logging.info(
+                f"{self.local.name}: {len(misses) - len(escalated)} crops read locally, "
+                f"{len(escalated)} escalated to Gemini in {time.monotonic() - start:.1f}s."
+            )
+            self.sources["local"] += len(misses) - len(escalated)
+            CROPS.inc(len(misses) - len(escalated), source="local")
+            if not self.verify:  # Otherwise they are published once graded, in finish()
+                self._publish([entry for entry, _ in misses if entry["text"] is not None])
+            misses = escalated
+        self.sources["gemini"] += len(misses)
+        CROPS.inc(len(misses), source="gemini")
+
+        # Upload the preprocessed (grayscale, trimmed, downscaled, compressed) part instead of the crop
+        for i, (entry, crop) in enumerate(misses):
+            image = upload_part(crop)
+            self.upload_bytes += len(image["data"])
+            self.original_bytes += len(crop["data"])
+            UPLOAD_BYTES.inc(len(image["data"]))
+            UPLOAD_BYTES_SAVED.inc(len(crop["data"]) - len(image["data"]))
+            misses[i] = (entry, image)
+
+        self.queued.extend(misses)
+        self._submit()
+        self._collect(wait=False)
+
+    def _submit(self, flush=False):
+        """Submit the queued misses; unless flushing, the last (possibly partial) batch waits for more crops.
+
+        Unless batch_size is given, batches are packed by estimated image
+        tokens with the adaptive planner. The scheduler runs several calls
+        concurrently within the rate limits.
+        """
+        if self.batch_size:
+            batches = [self.queued[i:i + self.batch_size] for i in range(0, len(self.queued), self.batch_size)]
+        else:
+            batches = self.planner.plan(self.queued, lambda miss: crop_tokens(miss[1]))
+        self.queued = batches.pop() if batches and not flush else []
+
+        for batch in batches:
+            items = {entry["id"]: image for entry, image in batch}
+            self.pending.append((batch, items, _submit_ocr_batch(self.scheduler, list(items.items()), self.verify, self.trace)))
+            self.batch_sizes.append(len(batch))
+
+    def _collect(self, wait):
+        """Resolve submitted batches in order and publish their results.
+
+        Without wait, stops at the first batch still in flight, so results are
+        published (and checkpointed) while later pages are still being added.
+        Answers are matched to images by ID; images missing from an answer
+        are re-requested on their own.
+        """
+        while self.pending and (wait or self.pending[0][2].done()):
+            batch, items, future = self.pending.popleft()
+            resubmit = lambda ids, items=items: _submit_ocr_batch(
+                self.scheduler, [(image_id, items[image_id]) for image_id in ids], self.verify, self.trace
+            )
+            answers, error = resolve_batch(future, list(items), resubmit)
+            if error:
+                logging.error(f"Batch failed after retries: {error}")
+
+            for entry, _ in batch:
+                if entry["id"] in answers and self.verify:
+                    entry["text"] = answers[entry["id"]]["text"]
+                    entry["verification"] = answers[entry["id"]]["verdict"]
+                elif entry["id"] in answers:
+                    entry["text"] = answers[entry["id"]]
+                elif error:
+                    entry["text"] = f"❌ AI processing failed - {str(error)}"
+                    entry["ok"] = False
+                else:
+                    entry["text"] = "No text detected"
+                if self.verify and "verification" not in entry:
+                    entry["verification"] = "AI Processing Failed" if error else "AI Error"
+
+            answered = [(entry, answers[entry["id"]]) for entry, _ in batch if entry["id"] in answers]
+            self.cache.put_many(
+                (entry["key"], json.dumps(answer, ensure_ascii=False) if self.verify else answer) for entry, answer in answered
+            )
+            self._publish([entry for entry, _ in batch])
+
+            if wait:
+                done = len(self.entries) - sum(len(batch) for batch, _, _ in self.pending)
+                self.progress.advance(done, len(self.entries), "crops")
+
+    def abort(self):
+        """Let the batches already in flight finish, so their results reach the checkpoint before a failure."""
+        self._collect(wait=True)
+
+    def finish(self):
+        """Wait for the submitted batches, write the job's text file and return the records in input order.
+
+        Batch sizes, upload bytes, the count per source, failed crops and the
+        planner state go into metrics if it was given.
+        """
+        self._submit(flush=True)
+        self.progress.stage("Extracting Text from Images...", 80, 100)
+        logging.info(
+            f"OCR sources: {self.sources['checkpoint']} checkpointed, {self.sources['cache']} cached, "
+            f"{self.sources['local']} local, {self.sources['gemini']} Gemini."
+        )
+        self._collect(wait=True)
+
+        if self.verify:
+            self._verify_local_reads()
+
+        if self.metrics is not None:
+            self.metrics["ocr_batch_sizes"] = self.batch_sizes
+            self.metrics["upload_bytes"] = self.upload_bytes
+            self.metrics["upload_bytes_saved"] = self.original_bytes - self.upload_bytes
+            self.metrics["ocr_sources"] = self.sources
+            self.metrics["ocr_planner"] = self.planner.snapshot()
+            self.metrics["failed_crops"] = sum(1 for entry in self.entries if not entry["ok"])
+
+        extracted_data = []
+        os.makedirs(self.workspace.root, exist_ok=True)  # Ensure the directory exists
+
+        with open(self.workspace.text_file, "w", encoding="utf-8") as text_file:
+            for entry in self.entries:
+                extracted_data.append(_record(self.workspace, entry))
+
+                if entry["ok"]:
                     # ✅ Save in "Image: filename | Text: extracted text" format
-                    text_file.write(f"Image: {filename}\nText: {extracted_text}\n\n")
+                    text = " ".join(entry["text"].splitlines())  # One line per image for /verify
+                    text_file.write(f"Image: {entry['filename']}\nText: {text}\n\n")
+
+        self.progress.finish("Text Extraction Completed")
+        return extracted_data
+
+    def _verify_local_reads(self):
+        """Grade the crops that never went through the fused prompt (local reads) in text-only calls.
+
+        With OCR_BACKEND=local they are marked UNVERIFIED instead.
+        """
+        ungraded = [entry for entry in self.entries if entry["ok"] and "verification" not in entry]
+        if not ungraded:
+            return
+        if OCR_BACKEND == "local":
+            for entry in ungraded:
+                entry["verification"] = UNVERIFIED
+        else:
+            results = verify_japanese_text([entry["text"] for entry in ungraded], metrics=self.metrics, trace=self.trace)
+            for entry, result in zip(ungraded, results):
+                entry["verification"] = result["verification"]
+        self._publish(ungraded)
+
+# ------------------- Pipelined Extraction -------------------
+# Render, segment and OCR run as concurrent stages, so the first Gemini batch
+# goes out while later pages are still rendering. False runs them one after another.
+PIPELINE_ENABLED = os.getenv("PIPELINE_ENABLED", "true").lower() == "true"
+
+def restored_pages(checkpoint, workspace):
+    """The leading run of checkpointed pages whose crops are all still on disk, as (page_number, filenames)."""
+    restored = []
+    for page_number, filenames in checkpoint.pages():
+        if page_number != len(restored) + 1:
+            break
+        if not all(os.path.exists(os.path.join(workspace.crops_dir, filename)) for filename in filenames):
+            break
+        restored.append((page_number, filenames))
+    return restored
+
+def run_pipeline(pdf_path, workspace, on_result=None, on_crops=None, progress=None, metrics=None, verify=False, checkpoint=None, trace=None):
+    """Extract text from a PDF with rendering, segmentation and OCR as concurrent stages.
+
+    Each page's crops go to OCRRun as soon as the page is segmented.
+    on_crops, if given, is called with the running crop count; per-stage
+    utilization goes into metrics["stages"].
+    """
+    from .segmentation import segment_pages
+    progress = progress or ProgressReporter(workspace.job_id)
+    page_count = count_pdf_pages(pdf_path)
+    run = OCRRun(workspace, on_result=on_result, progress=progress, metrics=metrics, verify=verify, checkpoint=checkpoint, trace=trace)
+    restored = restored_pages(checkpoint, workspace) if checkpoint else []
+    if restored:
+        logging.info(f"Resuming job {workspace.job_id} from page {len(restored) + 1} of {page_count}.")
+    progress.stage("Converting PDF and Extracting Questions...", 10, 70)
+    pages_done = 0
+
+    def add_page(crops):
+        nonlocal pages_done
+        run.add(crops)
+        pages_done += 1
+        if on_crops:
+            on_crops(len(run.entries))
+        progress.advance(pages_done, page_count, "pages")
+
+    def render(_, emit):
+        pages = iter_pdf_pages(pdf_path, page_count=page_count, start_page=len(restored) + 1)
+        for page_number, page in timed_iter(pages, "rasterize", trace):
+            emit((page_number, page_to_bgr(page_number, page, workspace)))
+
+    def segment(pages, emit):
+        segment_pages(pages, on_page=lambda page_number, crops: emit((page_number, crops)), trace=trace)
+
+    def ocr(pages, emit):
+        # With a checkpoint, pages are recorded once their crops are on disk; recorded pages are
+        # read back from disk instead of rendered again (and answered from it if finished too)
+        for page_number, filenames in restored:
+            add_page(filenames)
+        for page_number, crops in pages:
+            writes = persist_crops(crops, workspace, force=checkpoint is not None)
+            if checkpoint:
+                for write in writes:
+                    write.result()
+                checkpoint.add_page(page_number, [crop["filename"] for crop in crops])
+            elif on_result:
+                wait(writes)  # Records published while the job runs link to these crops
+            add_page(crops)
+            emit(crops)
 
-            except Exception as e:
-                for filename in batch:
-                    extracted_data.append({"image_url": f"{BACKEND_API}/static/cropped_questions/{filename}", "text": f"❌ AI processing failed - {str(e)}"})
+    try:
+        stats = Pipeline([("render", render), ("segment", segment), ("ocr", ocr)]).run()
+    except Exception:
+        run.abort()
+        raise
+    logging.info(f"Processed {page_count} pages, extracted {len(run.entries)} cropped questions.")
+
+    start = time.monotonic()
+    extracted_data = run.finish()
+    stats["finish_seconds"] = round(time.monotonic() - start, 3)
+    if metrics is not None:
+        metrics["stages"] = stats
+        metrics["pages_restored"] = len(restored)
+    return extracted_data
 
-            time.sleep(1)  # Avoid API rate limits
-    send_progress("Text Extraction Completed", 100)
+def extract_pdf(pdf_path, workspace, on_result=None, on_crops=None, progress=None, metrics=None, verify=False, trace=False,
+                resumable=False):
+    """Run the whole PDF -> crops -> text flow, pipelined unless PIPELINE_ENABLED is false.
+
+    verify adds each record's "verification" verdict (fused mode); trace puts
+    the timed spans of every stage into metrics["trace"].
+    """
+    # Resumable (queued) jobs are checkpointed, so a retried or recovered job resumes where it stopped.
+    # Checkpoints need the crops on disk, so they are written even with PERSIST_CROPS off. Sync and
+    # streamed uploads can never run again under the same ID, so they skip both.
+    checkpoint = None
+    if CHECKPOINT_ENABLED and resumable:
+        checkpoint = Checkpoint.for_job(workspace, pdf_path, "fused" if verify else "ocr")
+    trace = Trace() if trace else None
+    try:
+        if PIPELINE_ENABLED:
+            extracted_data = run_pipeline(
+                pdf_path, workspace, on_result=on_result, on_crops=on_crops, progress=progress, metrics=metrics,
+                verify=verify, checkpoint=checkpoint, trace=trace,
+            )
+        else:
+            # Sequential flow: every page is segmented again, but finished crops are not re-read
+            crops = stream_cropped_questions(pdf_path, workspace, progress, trace, wait_for_writes=on_result is not None)
+            if on_crops:
+                on_crops(len(crops))
+            run = OCRRun(workspace, on_result=on_result, progress=progress, metrics=metrics, verify=verify, checkpoint=checkpoint, trace=trace)
+            run.add(crops)
+            extracted_data = run.finish()
+    finally:
+        if checkpoint:
+            checkpoint.close()
+
+    if trace and metrics is not None:
+        metrics["trace"] = trace.to_dict()
     return extracted_data
 
 
 
+# ------------------- Background Jobs -------------------
+def run_extraction_job(job_id, params, jobs):
+    """Job handler: run the full extraction pipeline for a queued PDF, publishing partial results."""
+    workspace = Workspace(job_id).create()
+    try:
+        _run_extraction_job(job_id, params, jobs, workspace)
+    finally:
+        workspace.release()
+
+def _run_extraction_job(job_id, params, jobs, workspace):
+    progress = ProgressReporter(job_id)
+    jobs.update_progress(job_id, crops_total=0, crops_done=0)
+    done = 0
+
+    def on_result(records):
+        nonlocal done
+        done += len(records)
+        jobs.add_results(job_id, records)
+        jobs.update_progress(job_id, crops_done=done)
+
+    metrics = {}
+    extract_pdf(
+        params["pdf_path"], workspace, on_result=on_result, progress=progress, metrics=metrics,
+        on_crops=lambda total: jobs.update_progress(job_id, crops_total=total), verify=params.get("verify", False),
+        trace=params.get("trace", False), resumable=True,
+    )
+    jobs.set_metrics(job_id, metrics)
+    if metrics.get("failed_crops"):
+        raise RuntimeError(
+            f"{metrics['failed_crops']} crops failed; POST /extract/jobs/{job_id}/retry to resume from the checkpoint"
+        )
+
+job_queue = JobQueue(run_extraction_job)
+
+def start_job_queue():
+    """Start the job workers and resume unfinished jobs; called by the server entry points (main.py, serve.py).
+
+    Not done on import: segmentation workers re-import the main module, and a
+    queue started there would pick up the server's running jobs. With
+    OCR_BACKEND=local and no local engine the server refuses to start
+    (LocalOCRUnavailableError) rather than queue jobs it cannot run offline.
+    """
+    get_local_backend()
+    job_queue.start()
+
+def save_uploaded_pdf(workspace):
+    """Validate the uploaded PDF and save it in the job's workspace; returns (path, error_response)."""
+    if "file" not in request.files:
+        return None, (jsonify({"error": "No file uploaded"}), 400)
+
+    pdf_file = request.files["file"]
+    
+    if pdf_file.filename == "":
+        return None, (jsonify({"error": "No file selected"}), 400)
+
+    workspace.create()
+    pdf_path = os.path.join(workspace.root, os.path.basename(pdf_file.filename))
+    pdf_file.save(pdf_path)
+    return pdf_path, None
+
+def wants_verify():
+    """Whether the request opts into fused extract-and-verify (?verify= or a verify form field)."""
+    value = request.args.get("verify", request.form.get("verify"))
+    return FUSED_VERIFY if value is None else value.lower() == "true"
+
+def wants_trace():
+    """Whether the request asks for per-stage trace spans in its metrics (?trace= or a trace form field)."""
+    return request.args.get("trace", request.form.get("trace", "")).lower() == "true"
+
+def submit_extraction_job():
+    """Save the uploaded PDF and queue it; returns 202 with the job ID."""
+    collect_garbage_soon()
+    workspace = Workspace(uuid.uuid4().hex).claim()
+    pdf_path, error = save_uploaded_pdf(workspace)
+    if error:
+        workspace.release()
+        workspace.delete()
+        return error
+
+    try:
+        job_queue.submit({"pdf_path": pdf_path, "verify": wants_verify(), "trace": wants_trace()}, job_id=workspace.job_id)
+    except QueueFullError as e:
+        workspace.release()
+        workspace.delete()
+        return jsonify({"error": str(e)}), 503
+
+    return jsonify({"status": "queued", "job_id": workspace.job_id, "status_url": f"/extract/jobs/{workspace.job_id}"}), 202
+
+# ------------------- Streaming Responses -------------------
+def wants_stream():
+    """Whether the client asked for NDJSON streaming (?stream=true or Accept: application/x-ndjson)."""
+    return request.args.get("stream", "").lower() == "true" or "application/x-ndjson" in request.headers.get("Accept", "")
+
+def stream_extraction(pdf_path, workspace, verify=False, trace=False):
+    """Run the extraction in the background and stream each finished record as one NDJSON line.
+
+    Records are written as soon as their batch (or cache hit, or local read)
+    completes, in completion order; each carries its image_url, so clients
+    can place it. The last line is a summary with "status" ("success" or
+    "error"), the job ID and the metrics.
+    """
+    lines = queue.Queue()
+
+    def work():
+        metrics = {}
+        try:
+            extract_pdf(pdf_path, workspace, on_result=lines.put, metrics=metrics, verify=verify, trace=trace)
+            lines.put([{"status": "success", "job_id": workspace.job_id, "metrics": metrics}])
+        except Exception as e:
+            logging.error(f"Processing failed: {e}")
+            lines.put([{"status": "error", "job_id": workspace.job_id, "error": str(e)}])
+        finally:
+            workspace.release()
+            lines.put(None)
+
+    threading.Thread(target=work, name=f"stream-{workspace.job_id}", daemon=True).start()
+
+    def generate():
+        while True:
+            records = lines.get()
+            if records is None:
+                return
+            yield "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+
+    # Tell reverse proxies not to buffer, or the first records would be held back
+    return Response(generate(), mimetype="application/x-ndjson", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 # ------------------- Flask API -------------------
 @extract_bp.route("/extract-text", methods=["POST"])
 def extract_text():
-    """API endpoint to extract handwritten text from a PDF."""
+    """API endpoint to extract handwritten text from a PDF.
+
+    With ?async=true the PDF is queued and a job ID is returned immediately.
+    With ?verify=true each record also gets its Correct/Incorrect
+    "verification" from the same Gemini call, replacing /verify/verify-japanese.
+    With ?stream=true (or Accept: application/x-ndjson) records are streamed
+    as NDJSON while the extraction runs (see stream_extraction).
+    With ?trace=true the metrics include per-stage trace spans.
+    """
     if request.method == "OPTIONS":
         response = jsonify({"message": "CORS preflight successful"})
         response.headers.add("Access-Control-Allow-Origin", "*")
         response.headers.add("Access-Control-Allow-Methods", "GET, POST, OPTIONS")
         response.headers.add("Access-Control-Allow-Headers", "Content-Type")
         return response, 200
-    
-    if "file" not in request.files:
-        return jsonify({"error": "No file uploaded"}), 400
 
-    pdf_file = request.files["file"]
-    
-    if pdf_file.filename == "":
-        return jsonify({"error": "No file selected"}), 400
+    if request.args.get("async", "").lower() == "true":
+        return submit_extraction_job()
 
-    pdf_path = os.path.join(BASE_DIR, pdf_file.filename)
-    pdf_file.save(pdf_path)
+    collect_garbage_soon()
+    # Clients may pick the job ID themselves so they can join its progress room before uploading,
+    # but only a new one: a used ID would mix two uploads in one workspace
+    job_id = request.form.get("job_id") or uuid.uuid4().hex
+    if not CLIENT_JOB_ID_PATTERN.match(job_id):
+        return jsonify({"error": "job_id must be 32 lowercase hex characters"}), 400
+    try:
+        workspace = Workspace(job_id).claim()
+    except WorkspaceExistsError as e:
+        return jsonify({"error": str(e)}), 409
+    pdf_path, error = save_uploaded_pdf(workspace)
+    if error:
+        workspace.release()
+        workspace.delete()
+        return error
+    if wants_stream():
+        return stream_extraction(pdf_path, workspace, verify=wants_verify(), trace=wants_trace())
 
     try:
-        image_paths = pdf_to_images(pdf_path)
-        cropped_filenames = save_cropped_questions(image_paths)
-        extracted_data = extract_text_from_images(cropped_filenames)
+        metrics = {}
+        extracted_data = extract_pdf(pdf_path, workspace, metrics=metrics, verify=wants_verify(), trace=wants_trace())
 
-        return jsonify({"status": "success", "extracted_data": extracted_data})
+        return jsonify({"status": "success", "job_id": workspace.job_id, "extracted_data": extracted_data, "metrics": metrics})
     except Exception as e:
         logging.error(f"Processing failed: {e}")
         return jsonify({"error": str(e)}), 500
+    finally:
+        workspace.release()
+
+@extract_bp.route("/jobs", methods=["POST"])
+def create_job():
+    """Queue a PDF for extraction and return its job ID."""
+    return submit_extraction_job()
+
+@extract_bp.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    """Return a job's status, progress and the results finished so far."""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+
+    job.pop("params")
+    job["queue_depth"] = job_queue.depth()
+    return jsonify(job)
+
+@extract_bp.route("/jobs/<job_id>/retry", methods=["POST"])
+def retry_job(job_id):
+    """Re-run a finished or failed job; finished pages and crops are resumed from its checkpoint."""
+    try:
+        retried = job_queue.retry(job_id)
+    except QueueFullError as e:
+        return jsonify({"error": str(e)}), 503
+    if not retried:
+        return jsonify({"error": "Job not found or still running"}), 409
+
+    return jsonify({"status": "queued", "job_id": job_id, "status_url": f"/extract/jobs/{job_id}"}), 202
 
 # ------------------- New Endpoints for Serving Images -------------------
 @extract_bp.route("/images", methods=["GET"])
 def list_images():
-    """Returns a list of image URLs."""
-    if not os.path.exists(CROPPED_DIR):
+    """Returns a page of image URLs: the loose crops, or with ?job_id= those of one job.
+
+    Images are in page/question order; ?limit= sets the page size and
+    ?after=<next_after of the previous page> continues. Append ?size=N to an
+    image URL for a thumbnail.
+    """
+    job_id = request.args.get("job_id")
+    limit = min(max(request.args.get("limit", IMAGE_PAGE_SIZE, type=int), 1), IMAGE_MAX_PAGE_SIZE)
+    try:
+        page = get_listing_cache().page(crops_folder(job_id), request.args.get("after"), limit)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if page is None:
         return jsonify({"error": "Image directory not found"}), 404
 
-    images = os.listdir(CROPPED_DIR)  # List all images
-    image_urls = [f"http://127.0.0.1:5000/extract/images/{img}" for img in images]
-    
-    return jsonify({"images": image_urls})
-
-@extract_bp.route("/extract/images/<filename>")
+    names, total, next_after = page
+    base_url = f"{image_base_url()}/extract/images/" + (f"{job_id}/" if job_id else "")
+    return jsonify({"images": [base_url + name for name in names], "total": total, "next_after": next_after})
+
+@extract_bp.route("/images/jobs", methods=["GET"])
+def list_image_jobs():
+    """Returns a page of the jobs that have crops, each with its image count and listing URL (?limit=, ?after=)."""
+    limit = min(max(request.args.get("limit", IMAGE_PAGE_SIZE, type=int), 1), IMAGE_MAX_PAGE_SIZE)
+    job_ids, total, next_after = get_listing_cache().page(CROPPED_DIR, request.args.get("after"), limit, dirs=True)
+
+    jobs = []
+    for job_id in job_ids:
+        listing = get_listing_cache().entries(crops_folder(job_id))
+        if listing is not None:  # Deleted since the listing was cached
+            jobs.append({"job_id": job_id, "images": len(listing[0]), "images_url": f"{image_base_url()}/extract/images?job_id={job_id}"})
+    return jsonify({"jobs": jobs, "total": total, "next_after": next_after})
+
+def image_base_url():
+    """Public URL of this server: BACKEND_API if set, else the host the request came to."""
+    return (BACKEND_API or request.host_url).rstrip("/")
+
+@extract_bp.route("/cache/stats", methods=["GET"])
+def cache_stats():
+    """Returns OCR cache hit/miss counters and size."""
+    return jsonify(get_ocr_cache().stats())
+
+@extract_bp.route("/images/<path:filename>")
+@extract_bp.route("/extract/images/<path:filename>")  # Former path, kept for existing clients
 def get_image(filename):
-    """Serve an image from the directory."""
-    return send_from_directory(CROPPED_DIR, filename)
-
-
-
-
-
-
-
-
-
-
+    """Serve a crop, or with ?size=N a cached WebP thumbnail at most N pixels on its longest side.
+
+    Responses carry an ETag and Cache-Control, answer If-None-Match with
+    304 and support Range requests.
+    """
+    size = request.args.get("size", type=int)
+    if not size:
+        return send_from_directory(CROPPED_DIR, filename, max_age=IMAGE_CACHE_MAX_AGE)
+    try:
+        path = get_thumbnail(filename, size)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 415
+    if path is None:
+        return jsonify({"error": "Image not found"}), 404
+    return send_file(path, mimetype=THUMBNAIL_MIME_TYPE, conditional=True, etag=True, max_age=IMAGE_CACHE_MAX_AGE)
@@ -0,0 +1,141 @@
+import os
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from google.api_core import exceptions as api_exceptions
+from .batch_planner import crop_tokens, IMAGE_TILE_TOKENS
+from .metrics import GEMINI_CALLS, GEMINI_IN_FLIGHT, observe_stage
+
+# Configure Logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# Scheduler limits, shared by every blueprint that talks to Gemini
+GEMINI_MAX_IN_FLIGHT = int(os.getenv("GEMINI_MAX_IN_FLIGHT", "4"))
+GEMINI_REQUESTS_PER_MINUTE = int(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "60"))
+GEMINI_TOKENS_PER_MINUTE = int(os.getenv("GEMINI_TOKENS_PER_MINUTE", "1000000"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "5"))
+GEMINI_BACKOFF_SECONDS = float(os.getenv("GEMINI_BACKOFF_SECONDS", "1.0"))
+GEMINI_MAX_BACKOFF_SECONDS = float(os.getenv("GEMINI_MAX_BACKOFF_SECONDS", "60.0"))
+
+RATE_LIMIT_ERRORS = (api_exceptions.ResourceExhausted, api_exceptions.TooManyRequests)
+TRANSIENT_ERRORS = RATE_LIMIT_ERRORS + (
+    api_exceptions.ServiceUnavailable,
+    api_exceptions.DeadlineExceeded,
+    api_exceptions.InternalServerError,
+)
+
+def estimate_tokens(*parts):
+    """Roughly estimate the input tokens of a request made of text and image parts."""
+    tokens = 0
+    for part in parts:
+        if isinstance(part, str):
+            tokens += len(part) // 4 + 1
+        elif isinstance(part, (list, tuple)):
+            tokens += estimate_tokens(*part)
+        elif isinstance(part, dict) and "data" in part:
+            tokens += crop_tokens(part)
+        else:
+            tokens += IMAGE_TILE_TOKENS
+    return tokens
+
+def is_rate_limited(error):
+    """Return True if the error is a 429 / quota exhaustion from the API."""
+    return isinstance(error, RATE_LIMIT_ERRORS) or "429" in str(error)
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at rate_per_minute."""
+
+    def __init__(self, rate_per_minute):
+        self.capacity = float(rate_per_minute)
+        self.tokens = self.capacity
+        self.refill_per_second = self.capacity / 60.0
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_per_second)
+        self.updated_at = now
+
+    def acquire(self, amount=1):
+        """Block until amount tokens are available, then take them."""
+        amount = min(float(amount), self.capacity)  # An oversized request still gets through eventually
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.refill_per_second
+            time.sleep(wait)
+
+    def drain(self):
+        """Empty the bucket, e.g. after the server reported that the quota is exhausted."""
+        with self.lock:
+            self._refill()
+            self.tokens = 0.0
+
+class GeminiScheduler:
+    """Keeps up to max_in_flight Gemini calls running under requests/min and tokens/min limits.
+
+    Failed calls are retried with exponential backoff and full jitter; 429s
+    also drain the request bucket so every worker slows down together.
+    """
+
+    def __init__(self, max_in_flight=GEMINI_MAX_IN_FLIGHT, requests_per_minute=GEMINI_REQUESTS_PER_MINUTE,
+                 tokens_per_minute=GEMINI_TOKENS_PER_MINUTE, max_retries=GEMINI_MAX_RETRIES):
+        self.executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="gemini")
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+
+    def submit(self, fn, *args, tokens=0, trace=None, **kwargs):
+        """Schedule fn(*args, **kwargs) and return a Future with its result.
+
+        Every attempt is timed as a "gemini_call"; pass a metrics.Trace to record it as a span too.
+        """
+        return self.executor.submit(self._call, fn, args, kwargs, tokens, trace)
+
+    def _backoff(self, attempt, error):
+        base = GEMINI_BACKOFF_SECONDS * (4 if is_rate_limited(error) else 1)
+        return random.uniform(0, min(GEMINI_MAX_BACKOFF_SECONDS, base * 2 ** attempt))
+
+    def _call(self, fn, args, kwargs, tokens, trace=None):
+        for attempt in range(self.max_retries + 1):
+            self.request_bucket.acquire()
+            if tokens:
+                self.token_bucket.acquire(tokens)
+
+            GEMINI_IN_FLIGHT.inc()
+            start = time.monotonic()
+            outcome = "ok"
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                outcome = "rate_limited" if is_rate_limited(e) else "error"
+                if attempt == self.max_retries or not (isinstance(e, TRANSIENT_ERRORS) or is_rate_limited(e)):
+                    raise
+                error = e
+            finally:
+                GEMINI_IN_FLIGHT.dec()
+                GEMINI_CALLS.inc(outcome=outcome)
+                observe_stage("gemini_call", time.monotonic() - start, trace, start, attempt=attempt, tokens=tokens, outcome=outcome)
+
+            if is_rate_limited(error):
+                self.request_bucket.drain()
+            delay = self._backoff(attempt, error)
+            logging.warning(f"Gemini call failed ({error}); retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+            time.sleep(delay)
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler():
+    """Return the process-wide Gemini scheduler."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = GeminiScheduler()
+    return _scheduler
@@ -0,0 +1,76 @@
+import os
+
+# Crops are shrunk before upload: handwriting OCR does not need 200-dpi color renders
+PREPROCESS_UPLOADS = os.getenv("PREPROCESS_UPLOADS", "true").lower() == "true"
+UPLOAD_MAX_SIDE = int(os.getenv("UPLOAD_MAX_SIDE", "1024"))
+UPLOAD_FORMAT = os.getenv("UPLOAD_FORMAT", "webp")  # webp, jpeg or png
+UPLOAD_QUALITY = int(os.getenv("UPLOAD_QUALITY", "80"))
+TRIM_THRESHOLD = 200  # Pixels darker than this count as ink when trimming margins
+TRIM_PADDING = 4
+
+MIME_TYPES = {"webp": "image/webp", "jpeg": "image/jpeg", "png": "image/png"}
+ENCODE_PARAMS = {
+    "webp": lambda cv2, quality: [cv2.IMWRITE_WEBP_QUALITY, quality],
+    "jpeg": lambda cv2, quality: [cv2.IMWRITE_JPEG_QUALITY, quality],
+    "png": lambda cv2, quality: [cv2.IMWRITE_PNG_COMPRESSION, 9],
+}
+
+def _cv():
+    """OpenCV and NumPy, imported on first use so that importing the app does not load them."""
+    import cv2
+    import numpy as np
+    return cv2, np
+
+def preprocess_signature():
+    """Identifies the upload settings, so cached OCR results are not reused across them."""
+    if not PREPROCESS_UPLOADS:
+        return "original"
+    return f"gray-trim-{UPLOAD_MAX_SIDE}-{UPLOAD_FORMAT}-{UPLOAD_QUALITY}"
+
+def trim_margins(gray):
+    """Crop away blank margins around the ink, keeping a small padding."""
+    _, np = _cv()
+    rows = np.flatnonzero((gray < TRIM_THRESHOLD).any(axis=1))
+    if len(rows) == 0:
+        return gray
+    cols = np.flatnonzero((gray < TRIM_THRESHOLD).any(axis=0))
+    top, bottom = max(rows[0] - TRIM_PADDING, 0), min(rows[-1] + TRIM_PADDING + 1, gray.shape[0])
+    left, right = max(cols[0] - TRIM_PADDING, 0), min(cols[-1] + TRIM_PADDING + 1, gray.shape[1])
+    return gray[top:bottom, left:right]
+
+def downscale(gray, max_side=None):
+    """Shrink so the longest side is at most max_side; never upscales."""
+    cv2, _ = _cv()
+    max_side = max_side or UPLOAD_MAX_SIDE
+    height, width = gray.shape[:2]
+    scale = max_side / max(height, width)
+    if scale >= 1:
+        return gray
+    return cv2.resize(gray, (max(1, round(width * scale)), max(1, round(height * scale))), interpolation=cv2.INTER_AREA)
+
+def prepare_upload(img, image_format=None, quality=None):
+    """Grayscale, trim, downscale and compactly encode a BGR or gray crop for the model."""
+    cv2, _ = _cv()
+    image_format = image_format or UPLOAD_FORMAT
+    quality = quality or UPLOAD_QUALITY
+
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    gray = downscale(trim_margins(gray))
+
+    ok, buffer = cv2.imencode(f".{'jpg' if image_format == 'jpeg' else image_format}", gray, ENCODE_PARAMS[image_format](cv2, quality))
+    if not ok:
+        raise ValueError(f"Failed to encode crop as {image_format}")
+    return {"mime_type": MIME_TYPES[image_format], "data": buffer.tobytes(), "width": gray.shape[1], "height": gray.shape[0]}
+
+def upload_part(crop):
+    """The image part to send for a crop: its preprocessed upload if enabled, else the PNG itself."""
+    if not PREPROCESS_UPLOADS:
+        part = {"mime_type": crop["mime_type"], "data": crop["data"]}
+        if "width" in crop:
+            part.update(width=crop["width"], height=crop["height"])
+        return part
+    if "upload" in crop:
+        return crop["upload"]
+    cv2, np = _cv()
+    img = cv2.imdecode(np.frombuffer(crop["data"], dtype=np.uint8), cv2.IMREAD_COLOR)
+    return prepare_upload(img)
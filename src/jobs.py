@@ -0,0 +1,221 @@
+import os
+import json
+import time
+import uuid
+import queue
+import sqlite3
+import logging
+import threading
+
+# Configure Logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", os.path.join("processed_data", "jobs.sqlite3"))
+EXTRACT_JOB_WORKERS = int(os.getenv("EXTRACT_JOB_WORKERS", "2"))
+EXTRACT_QUEUE_MAX_DEPTH = int(os.getenv("EXTRACT_QUEUE_MAX_DEPTH", "100"))
+# With several server processes sharing the database, only one should pick up jobs left by a previous run
+EXTRACT_RECOVER_JOBS = os.getenv("EXTRACT_RECOVER_JOBS", "true").lower() == "true"
+# Jobs last touched before this time count as interrupted (default: when the queue is created);
+# a supervisor starting several processes passes its own start time
+EXTRACT_RECOVER_BEFORE = float(os.getenv("EXTRACT_RECOVER_BEFORE", "0")) or None
+# Name of this process among those sharing the database (set per worker by serve.py); jobs record
+# the worker holding them, so a restarted worker takes back the jobs its previous process left
+EXTRACT_WORKER_ID = os.getenv("EXTRACT_WORKER_ID") or None
+
+class QueueFullError(Exception):
+    """Raised when the job queue already holds EXTRACT_QUEUE_MAX_DEPTH waiting jobs."""
+
+class JobQueue:
+    """Bounded job queue persisted in SQLite and drained by a fixed pool of worker threads.
+
+    handler(job_id, params, job_queue) does the work; it may call
+    update_progress and add_results while running. Jobs that were queued or
+    running when the process stopped are picked up again on start(), unless
+    recover is off. Several processes may share the database: a job is
+    claimed atomically, and only jobs not touched since this process
+    started count as interrupted. A queue with a worker_id also takes back
+    the queued and running jobs of its own worker ID on start(), recover or
+    not: the process that held them under that ID is gone.
+    """
+
+    def __init__(self, handler, path=JOBS_DB_PATH, workers=EXTRACT_JOB_WORKERS, max_depth=EXTRACT_QUEUE_MAX_DEPTH,
+                 recover=EXTRACT_RECOVER_JOBS, worker_id=EXTRACT_WORKER_ID):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.handler = handler
+        self.recover = recover
+        self.worker_id = worker_id
+        self.started_at = EXTRACT_RECOVER_BEFORE or time.time()
+        self.workers = workers
+        self.max_depth = max_depth
+        self.pending = queue.Queue()
+        self.lock = threading.Lock()
+        self.threads = []
+
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, params TEXT NOT NULL, progress TEXT, error TEXT, "
+            "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._add_column("jobs", "metrics", "TEXT")
+        self._add_column("jobs", "worker", "TEXT")  # Worker ID of the process that queued or runs the job
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS job_results ("
+            "job_id TEXT NOT NULL, seq INTEGER NOT NULL, record TEXT NOT NULL, PRIMARY KEY (job_id, seq))"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)")
+        self.conn.commit()
+
+    def _add_column(self, table, column, column_type):
+        """Add a column to a table created by an older version of this module."""
+        columns = [row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")]
+        if column not in columns:
+            try:
+                self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+            except sqlite3.OperationalError as e:
+                if "duplicate column" not in str(e):  # Otherwise a process starting alongside added it first
+                    raise
+
+    def _execute(self, sql, args=()):
+        with self.lock:
+            cursor = self.conn.execute(sql, args)
+            self.conn.commit()
+            return cursor
+
+    def _query(self, sql, args=()):
+        with self.lock:
+            return self.conn.execute(sql, args).fetchall()
+
+    def start(self):
+        """Requeue interrupted jobs and start the worker threads."""
+        if self.threads:
+            return
+
+        recovered = []
+        if self.worker_id is not None:
+            recovered += self._requeue("worker = ?", (self.worker_id,))
+        if self.recover:
+            recovered += self._requeue("updated_at < ?", (self.started_at,))
+        for job_id in dict.fromkeys(recovered):
+            self.pending.put(job_id)
+        if recovered:
+            logging.info(f"Requeued {len(set(recovered))} unfinished jobs.")
+
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"extract-job-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def _requeue(self, condition, args):
+        """Take over the queued and running jobs matching condition; returns their IDs, oldest first."""
+        with self.lock:
+            with self.conn:
+                self.conn.execute(
+                    f"UPDATE jobs SET status = 'queued', worker = ? WHERE status IN ('queued', 'running') AND {condition}",
+                    (self.worker_id, *args),
+                )
+                rows = self.conn.execute(
+                    f"SELECT id FROM jobs WHERE status = 'queued' AND worker IS ? AND {condition} ORDER BY created_at",
+                    (self.worker_id, *args),
+                ).fetchall()
+        return [job_id for (job_id,) in rows]
+
+    def submit(self, params, job_id=None):
+        """Persist a new job and queue it; returns the job ID."""
+        if self.pending.qsize() >= self.max_depth:
+            raise QueueFullError(f"Job queue is full ({self.max_depth} jobs waiting)")
+
+        job_id = job_id or uuid.uuid4().hex
+        now = time.time()
+        self._execute(
+            "INSERT INTO jobs (id, status, params, progress, worker, created_at, updated_at) VALUES (?, 'queued', ?, '{}', ?, ?, ?)",
+            (job_id, json.dumps(params), self.worker_id, now, now),
+        )
+        self.pending.put(job_id)
+        return job_id
+
+    def retry(self, job_id):
+        """Queue a finished or failed job again; returns False if it is unknown or still queued/running.
+
+        The handler is expected to resume from its own checkpoint.
+        """
+        if self.pending.qsize() >= self.max_depth:
+            raise QueueFullError(f"Job queue is full ({self.max_depth} jobs waiting)")
+
+        cursor = self._execute(
+            "UPDATE jobs SET status = 'queued', error = NULL, worker = ?, updated_at = ? "
+            "WHERE id = ? AND status IN ('completed', 'failed')",
+            (self.worker_id, time.time(), job_id),
+        )
+        if cursor.rowcount == 0:
+            return False
+        self.pending.put(job_id)
+        return True
+
+    def update_progress(self, job_id, **progress):
+        row = self._query("SELECT progress FROM jobs WHERE id = ?", (job_id,))
+        merged = json.loads(row[0][0] or "{}") if row else {}
+        merged.update(progress)
+        self._execute("UPDATE jobs SET progress = ?, updated_at = ? WHERE id = ?", (json.dumps(merged), time.time(), job_id))
+
+    def set_metrics(self, job_id, metrics):
+        """Store the job's metrics (batch sizes, timings, ...) for the status endpoint."""
+        self._execute("UPDATE jobs SET metrics = ?, updated_at = ? WHERE id = ?", (json.dumps(metrics), time.time(), job_id))
+
+    def add_results(self, job_id, records):
+        """Append result records so they can be polled before the job finishes."""
+        with self.lock:
+            start = self.conn.execute("SELECT COUNT(*) FROM job_results WHERE job_id = ?", (job_id,)).fetchone()[0]
+            self.conn.executemany(
+                "INSERT INTO job_results (job_id, seq, record) VALUES (?, ?, ?)",
+                [(job_id, start + i, json.dumps(record, ensure_ascii=False)) for i, record in enumerate(records)],
+            )
+            self.conn.commit()
+
+    def get(self, job_id):
+        """Return the job's status, progress and (partial) results, or None if unknown."""
+        rows = self._query(
+            "SELECT status, params, progress, metrics, error, created_at, updated_at FROM jobs WHERE id = ?", (job_id,)
+        )
+        if not rows:
+            return None
+
+        status, params, progress, metrics, error, created_at, updated_at = rows[0]
+        records = self._query("SELECT record FROM job_results WHERE job_id = ? ORDER BY seq", (job_id,))
+        return {
+            "job_id": job_id,
+            "status": status,
+            "params": json.loads(params),
+            "progress": json.loads(progress or "{}"),
+            "metrics": json.loads(metrics or "{}"),
+            "error": error,
+            "created_at": created_at,
+            "updated_at": updated_at,
+            "extracted_data": [json.loads(record) for (record,) in records],
+        }
+
+    def depth(self):
+        return self.pending.qsize()
+
+    def _work(self):
+        while True:
+            job_id = self.pending.get()
+            # Claim the job; another process (or an earlier copy in this queue) may already have it
+            claimed = self._execute(
+                "UPDATE jobs SET status = 'running', worker = ?, updated_at = ? WHERE id = ? AND status = 'queued'",
+                (self.worker_id, time.time(), job_id),
+            )
+            if claimed.rowcount == 0:
+                continue
+            rows = self._query("SELECT params FROM jobs WHERE id = ?", (job_id,))
+            # A restarted job starts its results from scratch
+            self._execute("DELETE FROM job_results WHERE job_id = ?", (job_id,))
+            try:
+                self.handler(job_id, json.loads(rows[0][0]), self)
+                self._execute("UPDATE jobs SET status = 'completed', updated_at = ? WHERE id = ?", (time.time(), job_id))
+            except Exception as e:
+                logging.error(f"Job {job_id} failed: {e}")
+                self._execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, updated_at = ? WHERE id = ?", (str(e), time.time(), job_id)
+                )
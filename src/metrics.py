@@ -0,0 +1,173 @@
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+# Process-wide counters, gauges and histograms, rendered in the Prometheus text format by /metrics.
+# Kept dependency-free (no prometheus_client) and cheap enough for the per-crop hot path.
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+COUNT_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64)
+
+_registry = []
+
+def _label_key(labelnames, labels):
+    if set(labels) != set(labelnames):
+        raise ValueError(f"Expected labels {labelnames}, got {tuple(labels)}")
+    return tuple(str(labels[name]) for name in labelnames)
+
+def _format_labels(labelnames, key, extra=()):
+    pairs = list(zip(labelnames, key)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}
+        _registry.append(self)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            items = sorted(self.values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self.lock:
+            self.values[key] = value
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=SECONDS_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            counts, total = self.values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[index] += 1
+            self.values[key] = (counts, total + value)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self.values.items())
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _format_value(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+def render_metrics():
+    """All registered metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+# ------------------- Hot-Path Metrics -------------------
+STAGE_SECONDS = Histogram(
+    "ocr_stage_seconds", "Time spent per unit of work: rasterize/segment/encode per page, gemini_call per attempt, verify per run.",
+    ["stage"],
+)
+CROPS_PER_PAGE = Histogram("ocr_crops_per_page", "Question crops found per page.", buckets=COUNT_BUCKETS)
+UPLOAD_BYTES = Counter("ocr_upload_bytes_total", "Image bytes uploaded to Gemini.")
+UPLOAD_BYTES_SAVED = Counter("ocr_upload_bytes_saved_total", "Bytes saved by upload preprocessing versus the original PNGs.")
+CROPS = Counter("ocr_crops_total", "Crops answered, by source (checkpoint, cache, local, gemini).", ["source"])
+CACHE_REQUESTS = Counter("ocr_cache_requests_total", "Cache lookups by cache (ocr, verify, thumbnail) and result (hit, miss).", ["cache", "result"])
+GEMINI_IN_FLIGHT = Gauge("ocr_gemini_calls_in_flight", "Gemini calls currently running.")
+GEMINI_CALLS = Counter("ocr_gemini_calls_total", "Gemini call attempts by outcome (ok, rate_limited, error).", ["outcome"])
+
+# ------------------- Job Traces -------------------
+TRACE_MAX_SPANS = 10000  # Per job; later spans are counted but dropped
+
+class Trace:
+    """Timed spans of one job, returned in its result when tracing is requested.
+
+    Spans are recorded from any thread; start is seconds since the trace began.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+        self.spans = []
+        self.dropped = 0
+
+    def add(self, name, start, seconds, **attrs):
+        span = {"name": name, "start": round(start - self.started, 4), "seconds": round(seconds, 4), **attrs}
+        with self.lock:
+            if len(self.spans) < TRACE_MAX_SPANS:
+                self.spans.append(span)
+            else:
+                self.dropped += 1
+
+    def to_dict(self):
+        with self.lock:
+            return {"spans": sorted(self.spans, key=lambda span: span["start"]), "dropped_spans": self.dropped}
+
+def observe_stage(stage, seconds, trace=None, start=None, **attrs):
+    """Record a duration measured elsewhere (e.g. in a worker process)."""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    if trace:
+        trace.add(stage, time.monotonic() - seconds if start is None else start, seconds, **attrs)
+
+@contextmanager
+def timed(stage, trace=None, **attrs):
+    """Time the block as one unit of stage, adding a span to trace if given."""
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.monotonic() - start, trace, start, **attrs)
+
+def timed_iter(iterable, stage, trace=None):
+    """Yield from iterable, timing each item's production as one unit of stage."""
+    iterator = iter(iterable)
+    while True:
+        start = time.monotonic()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        observe_stage(stage, time.monotonic() - start, trace, start)
+        yield item
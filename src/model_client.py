@@ -0,0 +1,43 @@
+import os
+import logging
+import threading
+from dotenv import load_dotenv
+
+# Configure Logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# Load settings (API key, BACKEND_API, ...) from the .env file once for every module
+load_dotenv()
+API_KEY = os.getenv("GOOGLE_API_KEY")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+
+if not API_KEY:
+    logging.warning("GOOGLE_API_KEY is not set; Gemini calls will fail until it is.")
+
+_models = {}
+_models_lock = threading.Lock()
+_configured = False
+
+def get_model(name=GEMINI_MODEL):
+    """Return the process-wide Gemini client for name, shared by every blueprint.
+
+    google.generativeai is imported and configured on the first call, so
+    processes (and preforked workers) that never call Gemini never pay for it.
+    """
+    global _configured
+    with _models_lock:
+        if name not in _models:
+            if not API_KEY:
+                raise ValueError("API key not found. Set GOOGLE_API_KEY in the environment variables.")
+            import google.generativeai as genai  # Heavy (~0.7s): deferred to the first Gemini call
+            if not _configured:
+                genai.configure(api_key=API_KEY)
+                _configured = True
+            _models[name] = genai.GenerativeModel(name)
+            logging.info(f"Created Gemini client for {name}.")
+        return _models[name]
+
+def set_model(model, name=GEMINI_MODEL):
+    """Use model (anything with generate_content) as the client for name, e.g. a stub in benchmarks."""
+    with _models_lock:
+        _models[name] = model
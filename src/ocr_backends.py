@@ -0,0 +1,143 @@
+import os
+import atexit
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import pytesseract
+except ImportError:  # Optional: without it every crop goes to Gemini
+    pytesseract = None
+
+# Configure Logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# "hybrid" reads crops locally and escalates low-confidence ones to Gemini,
+# "local" never calls Gemini, "gemini" sends every crop to Gemini as before
+OCR_BACKEND = os.getenv("OCR_BACKEND", "hybrid")
+OCR_CONFIDENCE_THRESHOLD = float(os.getenv("OCR_CONFIDENCE_THRESHOLD", "80"))  # Tesseract confidence, 0-100
+LOCAL_OCR_ENGINE = os.getenv("LOCAL_OCR_ENGINE", "tesseract")
+TESSERACT_LANG = os.getenv("TESSERACT_LANG", "jpn")
+TESSERACT_CONFIG = os.getenv("TESSERACT_CONFIG", "--psm 6")
+# Tesseract runs as a subprocess per crop, so threads are enough to keep every core busy
+LOCAL_OCR_WORKERS = int(os.getenv("LOCAL_OCR_WORKERS", str(os.cpu_count() or 1)))
+
+class LocalOCRUnavailableError(RuntimeError):
+    """Raised when OCR_BACKEND is "local" but the local engine cannot run, since Gemini must not be used instead."""
+
+class OCRBackend:
+    """A local OCR engine; recognize(crop) returns {"text", "confidence"} with confidence in 0-100."""
+
+    name = "local"
+
+    def available(self):
+        return False
+
+    def recognize(self, crop):
+        raise NotImplementedError
+
+    def recognize_many(self, crops, pool=None):
+        """Recognize crops on the worker pool, in input order; failed crops get confidence 0."""
+        return list((pool or get_local_ocr_pool()).map(self._recognize_safely, crops))
+
+    def _recognize_safely(self, crop):
+        try:
+            return self.recognize(crop)
+        except Exception as e:
+            logging.warning(f"{self.name} failed on {crop.get('filename')}: {e}")
+            return {"text": "", "confidence": 0.0}
+
+def _join_words(words):
+    """Join recognized words, with spaces only between Latin words (Japanese is written without them)."""
+    text = ""
+    for word in words:
+        if text and text[-1].isascii() and word[0].isascii():
+            text += " "
+        text += word
+    return text
+
+class TesseractBackend(OCRBackend):
+    """Tesseract via pytesseract; confidence is the mean word confidence weighted by word length."""
+
+    name = "tesseract"
+
+    def __init__(self, lang=TESSERACT_LANG, config=TESSERACT_CONFIG):
+        self.lang = lang
+        self.config = config
+        self._available = None
+
+    def available(self):
+        if self._available is None:
+            self._available = False
+            if pytesseract is None:
+                logging.warning("pytesseract is not installed; local OCR is disabled.")
+                return False
+            try:
+                languages = set(pytesseract.get_languages(config=""))
+            except Exception as e:
+                logging.warning(f"Tesseract is not usable ({e}); local OCR is disabled.")
+                return False
+            missing = set(self.lang.split("+")) - languages
+            if missing:
+                logging.warning(f"Tesseract language data missing: {', '.join(sorted(missing))}; local OCR is disabled.")
+                return False
+            self._available = True
+        return self._available
+
+    def recognize(self, crop):
+        import cv2
+        import numpy as np
+        gray = cv2.imdecode(np.frombuffer(crop["data"], dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+        data = pytesseract.image_to_data(gray, lang=self.lang, config=self.config, output_type=pytesseract.Output.DICT)
+
+        lines = {}
+        weighted = 0.0
+        length = 0
+        for word, conf, block, par, line in zip(data["text"], data["conf"], data["block_num"], data["par_num"], data["line_num"]):
+            word = word.strip()
+            conf = float(conf)
+            if not word or conf < 0:
+                continue
+            lines.setdefault((block, par, line), []).append(word)
+            weighted += conf * len(word)
+            length += len(word)
+
+        text = "\n".join(_join_words(words) for words in lines.values())
+        return {"text": text, "confidence": weighted / length if length else 0.0}
+
+BACKENDS = {"tesseract": TesseractBackend}
+
+_pool = None
+_backend = None
+_lock = threading.Lock()
+
+def get_local_ocr_pool():
+    """Return the shared local OCR thread pool, creating it on first use."""
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=LOCAL_OCR_WORKERS, thread_name_prefix="local-ocr")
+            atexit.register(_pool.shutdown, wait=False, cancel_futures=True)
+    return _pool
+
+def get_local_backend():
+    """Return the local OCR backend, or None when OCR_BACKEND is "gemini" or no engine is installed.
+
+    In "local" mode a missing engine raises LocalOCRUnavailableError instead
+    of silently sending every crop to Gemini.
+    """
+    global _backend
+    if OCR_BACKEND == "gemini":
+        return None
+    with _lock:
+        if _backend is None:
+            _backend = BACKENDS[LOCAL_OCR_ENGINE]()
+    if _backend.available():
+        return _backend
+    if OCR_BACKEND == "local":
+        raise LocalOCRUnavailableError(f'OCR_BACKEND is "local" but {LOCAL_OCR_ENGINE} is not available')
+    return None
+
+def needs_escalation(result):
+    """True if a local result should be re-read by Gemini."""
+    return OCR_BACKEND != "local" and (not result["text"] or result["confidence"] < OCR_CONFIDENCE_THRESHOLD)
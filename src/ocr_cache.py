@@ -0,0 +1,119 @@
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from .metrics import CACHE_REQUESTS
+
+# Configure Logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+OCR_CACHE_PATH = os.getenv("OCR_CACHE_PATH", os.path.join("processed_data", "ocr_cache.sqlite3"))
+OCR_CACHE_MAX_BYTES = int(os.getenv("OCR_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+class OCRCache:
+    """Persistent OCR results keyed by crop content, prompt and model, with size-based LRU eviction."""
+
+    def __init__(self, path=OCR_CACHE_PATH, max_bytes=OCR_CACHE_MAX_BYTES):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS ocr_results ("
+            "key TEXT PRIMARY KEY, text TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_ocr_results_last_access ON ocr_results (last_access)")
+        self.conn.commit()
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM ocr_results").fetchone()[0]
+
+    @staticmethod
+    def make_key(image_bytes, prompt, model_name):
+        """Content address of a crop for a given prompt and model."""
+        digest = hashlib.sha256()
+        for part in (model_name.encode("utf-8"), prompt.encode("utf-8"), image_bytes):
+            digest.update(hashlib.sha256(part).digest())
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Return the cached text for key, or None on a miss."""
+        with self.lock:
+            row = self.conn.execute("SELECT text FROM ocr_results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                CACHE_REQUESTS.inc(cache="ocr", result="miss")
+                return None
+
+            self.hits += 1
+            CACHE_REQUESTS.inc(cache="ocr", result="hit")
+            self.conn.execute("UPDATE ocr_results SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+            return row[0]
+
+    def put_many(self, items):
+        """Store (key, text) pairs and evict least recently used entries if over budget."""
+        now = time.time()
+        with self.lock:
+            for key, text in items:
+                size = len(key) + len(text.encode("utf-8"))
+                old = self.conn.execute("SELECT size FROM ocr_results WHERE key = ?", (key,)).fetchone()
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO ocr_results (key, text, size, last_access) VALUES (?, ?, ?, ?)",
+                    (key, text, size, now),
+                )
+                self.total_bytes += size - (old[0] if old else 0)
+
+            self._evict()
+            self.conn.commit()
+
+    def put(self, key, text):
+        self.put_many([(key, text)])
+
+    def _evict(self):
+        if self.total_bytes <= self.max_bytes:
+            return
+
+        target = int(self.max_bytes * 0.9)  # Leave headroom so we don't evict on every insert
+        evicted = 0
+        while self.total_bytes > target:
+            rows = self.conn.execute("SELECT key, size FROM ocr_results ORDER BY last_access LIMIT 256").fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if self.total_bytes <= target:
+                    break
+                self.conn.execute("DELETE FROM ocr_results WHERE key = ?", (key,))
+                self.total_bytes -= size
+                evicted += 1
+
+        logging.info(f"OCR cache evicted {evicted} entries ({self.total_bytes} bytes remaining).")
+
+    def stats(self):
+        """Hit/miss counters and current size."""
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM ocr_results").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": entries,
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_ocr_cache():
+    """Return the process-wide OCR cache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = OCRCache()
+    return _cache
@@ -0,0 +1,140 @@
+import os
+import time
+import queue
+import logging
+import threading
+
+# Configure Logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# Items buffered between two stages; a slow stage blocks the ones before it instead of piling up pages
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "4"))
+
+_DONE = object()
+
+class PipelineAborted(Exception):
+    """Raised inside a stage when another stage failed, so it stops early."""
+
+class _Channel:
+    """Bounded queue between two stages that gives up once the pipeline is aborted."""
+
+    def __init__(self, maxsize, abort):
+        self.queue = queue.Queue(maxsize)
+        self.abort = abort
+
+    def put(self, item):
+        while not self.abort.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+        raise PipelineAborted()
+
+    def get(self):
+        while not self.abort.is_set():
+            try:
+                return self.queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        raise PipelineAborted()
+
+class Stage:
+    """One pipeline step: fn(inputs, emit) consumes an iterator of items and calls emit(item) per output.
+
+    Time spent waiting for input or for room downstream is tracked, so
+    utilization = busy / wall shows which stage is the bottleneck.
+    """
+
+    def __init__(self, name, fn):
+        self.name = name
+        self.fn = fn
+        self.items_in = 0
+        self.items_out = 0
+        self.wait_input = 0.0
+        self.wait_output = 0.0
+        self.started_at = None
+        self.finished_at = None
+
+    def _inputs(self, channel):
+        while True:
+            start = time.monotonic()
+            item = channel.get()
+            self.wait_input += time.monotonic() - start
+            if item is _DONE:
+                return
+            self.items_in += 1
+            yield item
+
+    def _emit(self, channel, item):
+        self.items_out += 1
+        if channel is not None:
+            start = time.monotonic()
+            channel.put(item)
+            self.wait_output += time.monotonic() - start
+
+    def stats(self):
+        wall = (self.finished_at or time.monotonic()) - (self.started_at or time.monotonic())
+        busy = max(0.0, wall - self.wait_input - self.wait_output)
+        return {
+            "items_in": self.items_in,
+            "items_out": self.items_out,
+            "wall_seconds": round(wall, 3),
+            "busy_seconds": round(busy, 3),
+            "wait_input_seconds": round(self.wait_input, 3),
+            "wait_output_seconds": round(self.wait_output, 3),
+            "utilization": round(busy / wall, 3) if wall > 0 else 0.0,
+        }
+
+class Pipeline:
+    """Runs stages concurrently, one thread each, connected by bounded queues.
+
+    The first stage gets no inputs and produces the stream; the last stage's
+    emitted items are only counted. If a stage raises, the others are
+    aborted and run() re-raises the first error.
+    """
+
+    def __init__(self, stages, queue_size=PIPELINE_QUEUE_SIZE):
+        self.stages = [Stage(name, fn) for name, fn in stages]
+        self.queue_size = queue_size
+
+    def run(self):
+        """Run every stage to completion and return per-stage stats."""
+        abort = threading.Event()
+        errors = []
+        channels = [None] + [_Channel(self.queue_size, abort) for _ in self.stages[1:]] + [None]
+
+        def work(i, stage):
+            stage.started_at = time.monotonic()
+            source, sink = channels[i], channels[i + 1]
+            try:
+                inputs = stage._inputs(source) if source else iter(())
+                stage.fn(inputs, lambda item: stage._emit(sink, item))
+                for _ in inputs:  # Drain whatever the stage left, so upstream never blocks
+                    pass
+                if sink:
+                    sink.put(_DONE)
+            except PipelineAborted:
+                pass
+            except BaseException as e:
+                logging.error(f"Pipeline stage {stage.name} failed: {e}")
+                errors.append(e)
+                abort.set()
+            finally:
+                stage.finished_at = time.monotonic()
+
+        start = time.monotonic()
+        threads = [
+            threading.Thread(target=work, args=(i, stage), name=f"pipeline-{stage.name}", daemon=True)
+            for i, stage in enumerate(self.stages)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if errors:
+            raise errors[0]
+        stats = {stage.name: stage.stats() for stage in self.stages}
+        stats["total_seconds"] = round(time.monotonic() - start, 3)
+        return stats
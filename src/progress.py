@@ -0,0 +1,79 @@
+import os
+import time
+import logging
+import threading
+from flask_socketio import join_room, leave_room
+from .socket_config import socketio
+
+# Configure Logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# Minimum seconds between two per-page / per-batch events of the same job
+PROGRESS_MIN_INTERVAL = float(os.getenv("PROGRESS_MIN_INTERVAL", "0.5"))
+
+def send_progress(step, percentage, job_id=None, **details):
+    """Emit a progress event to the job's room (or to everyone if no job is given)."""
+    payload = {"step": step, "progress_percent": percentage, **details}
+    if job_id:
+        payload["job_id"] = job_id
+    logging.debug("Emitting progress: %s", payload)  # Formatted only when debug logging is on
+    socketio.emit("progress", payload, to=job_id)
+
+class ProgressReporter:
+    """Per-job progress events with counts and ETA, coalesced to one per PROGRESS_MIN_INTERVAL.
+
+    Stage transitions are always sent; intermediate advance() calls inside a
+    stage are dropped if the previous event went out less than the interval
+    ago, except for the last unit of the stage.
+    """
+
+    def __init__(self, job_id, min_interval=PROGRESS_MIN_INTERVAL):
+        self.job_id = job_id
+        self.min_interval = min_interval
+        self.lock = threading.Lock()
+        self.step = None
+        self.start_percent = 0
+        self.end_percent = 0
+        self.stage_started_at = time.monotonic()
+        self.last_emit_at = 0.0
+
+    def stage(self, step, start_percent, end_percent=None):
+        """Begin a stage that spans start_percent..end_percent of the overall progress."""
+        with self.lock:
+            self.step = step
+            self.start_percent = start_percent
+            self.end_percent = start_percent if end_percent is None else end_percent
+            self.stage_started_at = time.monotonic()
+            self.last_emit_at = self.stage_started_at
+        send_progress(step, start_percent, self.job_id)
+
+    def advance(self, done, total, unit="items"):
+        """Report done/total units of the current stage."""
+        now = time.monotonic()
+        with self.lock:
+            if done < total and now - self.last_emit_at < self.min_interval:
+                return
+            self.last_emit_at = now
+            step = self.step
+            span = self.end_percent - self.start_percent
+            percentage = self.start_percent + (span * done // total if total else span)
+            elapsed = now - self.stage_started_at
+            eta = round(elapsed / done * (total - done), 1) if done else None
+
+        send_progress(step, percentage, self.job_id, done=done, total=total, unit=unit, eta_seconds=eta)
+
+    def finish(self, step, percentage=100):
+        send_progress(step, percentage, self.job_id)
+
+@socketio.on("join")
+def join_job_room(data):
+    """Subscribe the client to a job's progress events: emit("join", {"job_id": ...})."""
+    job_id = (data or {}).get("job_id")
+    if job_id:
+        join_room(job_id)
+
+@socketio.on("leave")
+def leave_job_room(data):
+    job_id = (data or {}).get("job_id")
+    if job_id:
+        leave_room(job_id)
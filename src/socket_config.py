@@ -1,4 +1,15 @@
+import os
 from flask_socketio import SocketIO
 
+# Server workers share progress events through a message queue (e.g. redis://localhost:6379/0);
+# without one, events only reach clients connected to the worker running the job
+SOCKETIO_MESSAGE_QUEUE = os.getenv("SOCKETIO_MESSAGE_QUEUE") or None
+SOCKETIO_ASYNC_MODE = os.getenv("SOCKETIO_ASYNC_MODE") or None  # serve.py sets threading; None picks the best installed
+# Per-packet Socket.IO / Engine.IO logging; off by default, it logs every frame
+SOCKETIO_LOGGING = os.getenv("SOCKETIO_LOGGING", "false").lower() == "true"
+
 # Enable CORS for WebSockets
-socketio = SocketIO(cors_allowed_origins="*", logger=True, engineio_logger=True)
+socketio = SocketIO(
+    cors_allowed_origins="*", logger=SOCKETIO_LOGGING, engineio_logger=SOCKETIO_LOGGING,
+    async_mode=SOCKETIO_ASYNC_MODE, message_queue=SOCKETIO_MESSAGE_QUEUE,
+)
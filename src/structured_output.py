@@ -0,0 +1,98 @@
+import os
+import json
+import logging
+
+# Configure Logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# How many times the items missing from a structured answer are re-requested
+STRUCTURED_RETRIES = int(os.getenv("STRUCTURED_RETRIES", "2"))
+
+def records_config(fields):
+    """Generation config asking Gemini for a JSON array of {"id", field...} objects.
+
+    fields maps each string field to its allowed values, or None for free text.
+    """
+    properties = {"id": {"type": "string"}}
+    for field, enum in fields.items():
+        properties[field] = {"type": "string"}
+        if enum:
+            properties[field]["enum"] = list(enum)
+    return {
+        "response_mime_type": "application/json",
+        "response_schema": {
+            "type": "array",
+            "items": {"type": "object", "properties": properties, "required": list(properties)},
+        },
+    }
+
+def items_config(value_field, enum=None):
+    """Generation config asking Gemini for a JSON array of {"id", value_field} objects."""
+    return records_config({value_field: enum})
+
+def parse_records(response_text, expected_ids, fields):
+    """Validate a structured answer and return {id: {field: value}} for the expected IDs it answered.
+
+    Unknown IDs, duplicates (after the first), and items with a missing or
+    non-string field or a value outside that field's allowed values are
+    dropped, so the caller can re-request exactly those.
+    """
+    try:
+        items = json.loads(response_text or "[]")
+    except json.JSONDecodeError:
+        logging.warning("Gemini returned invalid JSON for a structured request.")
+        return {}
+
+    if isinstance(items, dict):
+        items = items.get("items", [])
+    if not isinstance(items, list):
+        return {}
+
+    expected = set(expected_ids)
+    records = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        item_id = str(item.get("id", "")).strip()
+        if item_id not in expected or item_id in records:
+            continue
+        record = {}
+        for field, allowed in fields.items():
+            value = item.get(field)
+            if not isinstance(value, str):
+                break
+            value = value.strip()
+            if allowed is not None and value not in allowed:
+                break
+            record[field] = value
+        else:
+            records[item_id] = record
+    return records
+
+def parse_items(response_text, expected_ids, value_field, allowed=None):
+    """Like parse_records for a single field; returns {id: value}."""
+    records = parse_records(response_text, expected_ids, {value_field: allowed})
+    return {item_id: record[value_field] for item_id, record in records.items()}
+
+def resolve_batch(future, ids, resubmit, retries=STRUCTURED_RETRIES):
+    """Wait for a batch answer and re-request only the IDs it missed.
+
+    resubmit(missing_ids) must return a new future for just those items.
+    Returns (values_by_id, error); error is set if a call failed for good.
+    """
+    values = {}
+    remaining = list(ids)
+
+    for attempt in range(retries + 1):
+        try:
+            values.update(future.result())
+        except Exception as e:
+            return values, e
+
+        remaining = [item_id for item_id in remaining if item_id not in values]
+        if not remaining or attempt == retries:
+            break
+        logging.warning(f"Structured answer missed {len(remaining)} of {len(ids)} items; re-requesting them.")
+        future = resubmit(remaining)
+
+    return values, None
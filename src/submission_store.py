@@ -0,0 +1,210 @@
+import os
+import re
+import sys
+import time
+import uuid
+import sqlite3
+import logging
+import argparse
+import threading
+from datetime import datetime
+from urllib.parse import urlparse
+
+# Configure Logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+SUBMISSIONS_DB_PATH = os.getenv("SUBMISSIONS_DB_PATH", os.path.join("ocr_data", "submissions.sqlite3"))
+SUBMISSIONS_PAGE_SIZE = 100
+SUBMISSIONS_MAX_PAGE_SIZE = 1000
+
+# Crop URLs look like .../static/cropped_questions/<job_id>/<filename>
+JOB_URL_PATTERN = re.compile(r"/cropped_questions/([^/]+)/[^/]+$")
+
+def parse_image_url(image_url):
+    """(image_filename, job_id or None) of a crop URL."""
+    path = urlparse(image_url).path
+    match = JOB_URL_PATTERN.search(path)
+    return os.path.basename(path), match.group(1) if match else None
+
+class SubmissionStore:
+    """Append-only store of submitted records in SQLite (WAL).
+
+    Every record is one row keyed by an autoincrement ID, so inserts append
+    to the end of the table and the indexes on image filename, job and time
+    grow logarithmically: insert latency stays flat as the store grows.
+    A submission's records are written in one transaction.
+    """
+
+    def __init__(self, path=SUBMISSIONS_DB_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")  # Durable across app crashes; WAL keeps it consistent
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS submissions ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, submission_id TEXT NOT NULL, job_id TEXT, "
+            "image_filename TEXT NOT NULL, image_url TEXT NOT NULL, text TEXT NOT NULL, verification TEXT, "
+            "created_at REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_submissions_submission ON submissions (submission_id)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_submissions_image ON submissions (image_filename, id)")
+        # Latest record per URL for exports: filenames repeat across jobs, URLs do not
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_submissions_url ON submissions (image_url, id)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_submissions_job ON submissions (job_id, id)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_submissions_created ON submissions (created_at)")
+        self.conn.commit()
+
+    def insert(self, items, submission_id=None, created_at=None):
+        """Store a submission's {image_url, text[, verification, job_id]} items; returns (submission_id, count).
+
+        Items without an image_url or text are skipped, as before.
+        """
+        submission_id = submission_id or uuid.uuid4().hex
+        created_at = created_at or time.time()
+        rows = []
+        for item in items:
+            image_url, text = item.get("image_url"), item.get("text")
+            if not image_url or not text:
+                continue
+            image_filename, job_id = parse_image_url(image_url)
+            rows.append((
+                submission_id, item.get("job_id") or job_id, image_filename, image_url, text,
+                item.get("verification"), created_at,
+            ))
+
+        with self.lock:
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT INTO submissions (submission_id, job_id, image_filename, image_url, text, verification, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+        return submission_id, len(rows)
+
+    def exists(self, submission_id):
+        with self.lock:
+            return self.conn.execute(
+                "SELECT 1 FROM submissions WHERE submission_id = ? LIMIT 1", (submission_id,)
+            ).fetchone() is not None
+
+    def query(self, submission_id=None, image_filename=None, job_id=None, since=None, until=None,
+              before_id=None, limit=SUBMISSIONS_PAGE_SIZE):
+        """Newest-first records matching every given filter.
+
+        Pages are keyed by ID: pass the last returned ID as before_id for the next page.
+        limit=None returns every match (used for a single submission's records).
+        """
+        clauses, args = [], []
+        for column, value in (("submission_id", submission_id), ("image_filename", image_filename), ("job_id", job_id)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                args.append(value)
+        if since is not None:
+            clauses.append("created_at >= ?")
+            args.append(since)
+        if until is not None:
+            clauses.append("created_at < ?")
+            args.append(until)
+        if before_id is not None:
+            clauses.append("id < ?")
+            args.append(before_id)
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        args.append(-1 if limit is None else min(limit, SUBMISSIONS_MAX_PAGE_SIZE))
+        with self.lock:
+            cursor = self.conn.execute(
+                "SELECT id, submission_id, job_id, image_filename, image_url, text, verification, created_at "
+                f"FROM submissions {where} ORDER BY id DESC LIMIT ?",
+                args,
+            )
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def iter_latest(self, page_size=SUBMISSIONS_PAGE_SIZE):
+        """Yield the final (most recently submitted) record of every image URL, newest first.
+
+        Reads page_size rows at a time, so memory stays constant however large the store is.
+        """
+        # A plain id < ? (no "first page" special case) lets every page seek into the primary key
+        with self.lock:
+            before_id = self.conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM submissions").fetchone()[0]
+        while True:
+            with self.lock:
+                cursor = self.conn.execute(
+                    "SELECT id, submission_id, job_id, image_filename, image_url, text, verification, created_at "
+                    "FROM submissions AS s WHERE id < ? AND id = ("
+                    "SELECT MAX(id) FROM submissions WHERE image_url = s.image_url"
+                    ") ORDER BY id DESC LIMIT ?",
+                    (before_id, page_size),
+                )
+                columns = [column[0] for column in cursor.description]
+                rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+            if not rows:
+                return
+            yield from rows
+            before_id = rows[-1]["id"]
+
+    def stats(self):
+        with self.lock:
+            records, submissions = self.conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT submission_id) FROM submissions"
+            ).fetchone()
+        return {"records": records, "submissions": submissions}
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_submission_store():
+    """Return the process-wide submission store."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SubmissionStore()
+    return _store
+
+# ------------------- Legacy Import -------------------
+LEGACY_FILE_PATTERN = re.compile(r"^submission_(\d{14})\.txt$")
+
+def parse_legacy_file(path):
+    """Items of a legacy submission_%Y%m%d%H%M%S.txt file."""
+    items = []
+    item = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if line.startswith("Image URL: "):
+                item["image_url"] = line[len("Image URL: "):]
+            elif line.startswith("Extracted Text: "):
+                item["text"] = line[len("Extracted Text: "):]
+            elif line.startswith("-" * 40):
+                items.append(item)
+                item = {}
+    if item:
+        items.append(item)
+    return items
+
+def import_legacy(folder, store=None):
+    """Import legacy text submissions from folder; files already imported are skipped. Returns records imported."""
+    store = store or get_submission_store()
+    imported = 0
+    for name in sorted(os.listdir(folder)):
+        match = LEGACY_FILE_PATTERN.match(name)
+        if not match:
+            continue
+        submission_id = f"legacy-{match.group(1)}"
+        if store.exists(submission_id):
+            continue
+        created_at = datetime.strptime(match.group(1), "%Y%m%d%H%M%S").timestamp()
+        _, count = store.insert(parse_legacy_file(os.path.join(folder, name)), submission_id, created_at)
+        imported += count
+        logging.info(f"Imported {count} records from {name}.")
+    return imported
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import legacy submission text files into the submission store.")
+    parser.add_argument("folder", nargs="?", default=os.path.join("ocr_data", "uploads"))
+    args = parser.parse_args()
+    if not os.path.isdir(args.folder):
+        sys.exit(f"Folder not found: {args.folder}")
+    print(f"Imported {import_legacy(args.folder)} records.")
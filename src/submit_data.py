@@ -1,16 +1,39 @@
 import os
 import json
+import threading
 from flask import Flask,Blueprint, request, jsonify
 from flask_cors import CORS
-from urllib.parse import urlparse
 from datetime import datetime
+from .submission_store import get_submission_store, import_legacy, SUBMISSIONS_PAGE_SIZE, SUBMISSIONS_MAX_PAGE_SIZE
 
 
 
 submit_bp = Blueprint("submit", __name__)
-# Create an 'uploads' folder if it doesn't exist
+# Legacy per-submission text files; imported into the submission store on first use
 UPLOAD_FOLDER = "ocr_data/uploads"
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+
+_legacy_imported = False
+_legacy_lock = threading.Lock()
+
+def submission_store():
+    """The submission store, with the legacy upload files imported once per process."""
+    global _legacy_imported
+    store = get_submission_store()
+    with _legacy_lock:
+        if not _legacy_imported:
+            if os.path.isdir(UPLOAD_FOLDER):
+                import_legacy(UPLOAD_FOLDER, store)
+            _legacy_imported = True
+    return store
+
+def parse_time(value):
+    """Epoch seconds from a query parameter given as epoch seconds or ISO 8601."""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
 
 @submit_bp.route('/')
 def home():
@@ -41,38 +64,48 @@ def submit_data():
 
             processed_data.append(item)  # Add the valid JSON object
 
-        # Create a unique filename for the entire submission
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        file_path = os.path.join(UPLOAD_FOLDER, f"submission_{timestamp}.txt")
-
-        # Open the file once and write all entries
-        with open(file_path, "w", encoding="utf-8") as file:
-            for item in processed_data:
-                image_url = item.get("image_url")
-                text = item.get("text")
-
-                if not image_url or not text:
-                    continue  # Skip invalid entries
-
-                # Extract a valid filename from the URL for display purposes
-                parsed_url = urlparse(image_url)
-                image_filename = os.path.basename(parsed_url.path)
-
-                # Write the data into the file
-                file.write(f"Image Filename: {image_filename}\n")
-                file.write(f"Image URL: {image_url}\n")
-                file.write(f"Extracted Text: {text}\n")
-                file.write("-" * 40 + "\n")  # Separator between entries
+        # One transaction per submission; IDs are unique even for submissions in the same second
+        submission_id, saved = submission_store().insert(processed_data)
 
         response = {
             "message": "Data received and saved successfully!",
-            "saved_file": file_path
+            "submission_id": submission_id,
+            "saved": saved,
         }
         return jsonify(response), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@submit_bp.route('/submissions', methods=['GET'])
+def list_submissions():
+    """Newest-first submitted records.
 
-
-
+    Filters: ?image= (image filename), ?job_id=, ?since= / ?until= (epoch
+    seconds or ISO 8601). Pass the returned next_before_id as ?before_id=
+    for the next page; ?limit= sets the page size.
+    """
+    try:
+        since, until = parse_time(request.args.get("since")), parse_time(request.args.get("until"))
+        before_id = request.args.get("before_id", type=int)
+        limit = request.args.get("limit", SUBMISSIONS_PAGE_SIZE, type=int)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid time: {e}"}), 400
+    if limit < 1:
+        return jsonify({"error": "limit must be positive"}), 400
+    # Clamp here as the store does, or a full capped page would look like the last one
+    limit = min(limit, SUBMISSIONS_MAX_PAGE_SIZE)
+
+    records = submission_store().query(
+        image_filename=request.args.get("image"), job_id=request.args.get("job_id"),
+        since=since, until=until, before_id=before_id, limit=limit,
+    )
+    next_before_id = records[-1]["id"] if len(records) == limit else None
+    return jsonify({"records": records, "next_before_id": next_before_id})
+
+@submit_bp.route('/submissions/<submission_id>', methods=['GET'])
+def get_submission(submission_id):
+    records = submission_store().query(submission_id=submission_id, limit=None)
+    if not records:
+        return jsonify({"error": "Submission not found"}), 404
+    return jsonify({"submission_id": submission_id, "created_at": records[0]["created_at"], "records": records[::-1]})
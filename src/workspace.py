@@ -0,0 +1,194 @@
+import os
+import re
+import time
+import shutil
+import logging
+import threading
+
+# Configure Logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# Per-job private files (uploaded PDF, page renders, extracted text) and public crops
+WORKSPACES_DIR = os.path.join("processed_data", "jobs")
+CROPS_ROOT = os.path.join(os.getcwd(), "static", "cropped_questions")
+
+WORKSPACE_MAX_AGE_HOURS = float(os.getenv("WORKSPACE_MAX_AGE_HOURS", "24"))
+WORKSPACE_QUOTA_MB = float(os.getenv("WORKSPACE_QUOTA_MB", "2048"))
+# Garbage collection walks every workspace, so uploads trigger it at most this often
+WORKSPACE_GC_INTERVAL_SECONDS = float(os.getenv("WORKSPACE_GC_INTERVAL_SECONDS", "300"))
+
+_active = set()  # Job IDs whose workspaces must not be collected
+# Written into the workspace of an active job with the owning PID, so other server processes do not collect it either
+ACTIVE_MARKER = "active.pid"
+_active_lock = threading.Lock()
+_last_collection = 0.0
+_collection_lock = threading.Lock()
+
+# Job IDs clients may choose for sync uploads: the same 32-char hex form as generated ones
+CLIENT_JOB_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+class WorkspaceExistsError(Exception):
+    """Raised when a new job would reuse the workspace of an existing or running one."""
+
+def is_job_id(name):
+    """Whether name can be a job folder: a plain file name, not hidden (e.g. .ipynb_checkpoints)."""
+    return bool(name) and os.path.basename(name) == name and not name.startswith(".")
+
+class Workspace:
+    """Directories owned by a single job, so concurrent uploads never share files."""
+
+    def __init__(self, job_id):
+        if not is_job_id(job_id):
+            raise ValueError(f"Invalid job ID: {job_id!r}")
+        self.job_id = job_id
+        self.root = os.path.join(WORKSPACES_DIR, job_id)
+        self.pages_dir = os.path.join(self.root, "pages")
+        self.crops_dir = os.path.join(CROPS_ROOT, job_id)
+        self.text_file = os.path.join(self.root, "extracted_text.txt")
+        self.checkpoint_file = os.path.join(self.root, "checkpoint.sqlite3")
+        self.active_marker = os.path.join(self.root, ACTIVE_MARKER)
+
+    def create(self):
+        """Create the job's directories and protect them from garbage collection."""
+        os.makedirs(self.root, exist_ok=True)
+        os.makedirs(self.crops_dir, exist_ok=True)
+        with _active_lock:
+            _active.add(self.job_id)
+        self._mark_active()
+        return self
+
+    def claim(self):
+        """Create the workspace of a new job, refusing an ID whose workspace exists or is in use.
+
+        Creating the job folder is the atomic step, so two processes cannot
+        claim the same ID either.
+        """
+        with _active_lock:
+            if self.job_id in _active or os.path.exists(self.crops_dir):
+                raise WorkspaceExistsError(f"Job {self.job_id} already exists")
+            os.makedirs(WORKSPACES_DIR, exist_ok=True)
+            try:
+                os.mkdir(self.root)
+            except FileExistsError:
+                raise WorkspaceExistsError(f"Job {self.job_id} already exists") from None
+            _active.add(self.job_id)
+        self._mark_active()
+        os.makedirs(self.crops_dir, exist_ok=True)
+        return self
+
+    def _mark_active(self):
+        with open(self.active_marker, "w") as f:
+            f.write(str(os.getpid()))
+
+    def release(self):
+        """Allow the workspace to be garbage collected once it is old enough."""
+        with _active_lock:
+            _active.discard(self.job_id)
+        try:
+            os.remove(self.active_marker)
+        except FileNotFoundError:
+            pass
+
+    def in_use(self):
+        """Whether another live process holds this workspace (see ACTIVE_MARKER)."""
+        try:
+            with open(self.active_marker) as f:
+                pid = int(f.read())
+        except (OSError, ValueError):
+            return False
+        return pid != os.getpid() and _process_alive(pid)
+
+    def exists(self):
+        return os.path.isdir(self.root)
+
+    def delete(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+        shutil.rmtree(self.crops_dir, ignore_errors=True)
+
+    def last_modified(self):
+        return max((os.path.getmtime(path) for path in (self.root, self.crops_dir) if os.path.exists(path)), default=0)
+
+    def size(self):
+        total = 0
+        for top in (self.root, self.crops_dir):
+            for dirpath, _, filenames in os.walk(top):
+                total += sum(os.path.getsize(os.path.join(dirpath, name)) for name in filenames)
+        return total
+
+def _process_alive(pid):
+    """Whether process pid is running; assumed so where that cannot be checked."""
+    if os.name == "nt":  # os.kill(pid, 0) would send it CTRL_C_EVENT
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def _job_folders(top):
+    if not os.path.isdir(top):
+        return
+    with os.scandir(top) as scan:
+        for entry in scan:
+            if entry.is_dir() and is_job_id(entry.name):
+                yield entry.name
+
+def list_workspaces():
+    """All existing workspaces, oldest first. Folders that cannot be job IDs are ignored."""
+    job_ids = set()
+    for top in (WORKSPACES_DIR, CROPS_ROOT):
+        job_ids.update(_job_folders(top))
+    return sorted((Workspace(job_id) for job_id in job_ids), key=Workspace.last_modified)
+
+def any_workspaces():
+    """Whether any job workspace exists, without listing them all."""
+    return any(next(_job_folders(top), None) for top in (WORKSPACES_DIR, CROPS_ROOT))
+
+def collect_garbage(max_age_hours=WORKSPACE_MAX_AGE_HOURS, quota_mb=WORKSPACE_QUOTA_MB):
+    """Delete inactive workspaces older than max_age_hours, then the oldest ones until under quota_mb.
+
+    Workspaces active in this process or (by their marker) in another live one are kept.
+    """
+    with _active_lock:
+        active = set(_active)
+
+    cutoff = time.time() - max_age_hours * 3600
+    remaining = []
+    removed = 0
+
+    for ws in list_workspaces():
+        if ws.job_id in active or ws.in_use():
+            continue
+        if ws.last_modified() < cutoff:
+            ws.delete()
+            removed += 1
+        else:
+            remaining.append((ws, ws.size()))
+
+    total = sum(size for _, size in remaining)
+    quota = quota_mb * 1024 * 1024
+    for ws, size in remaining:  # Oldest first
+        if total <= quota:
+            break
+        ws.delete()
+        total -= size
+        removed += 1
+
+    if removed:
+        logging.info(f"Garbage collected {removed} job workspaces.")
+    return removed
+
+def collect_garbage_soon(interval=WORKSPACE_GC_INTERVAL_SECONDS):
+    """Run collect_garbage on a background thread, unless it ran less than interval seconds ago.
+
+    Called on every upload; the walk over all workspaces stays off the request path.
+    """
+    global _last_collection
+    with _collection_lock:
+        if time.time() - _last_collection < interval:
+            return False
+        _last_collection = time.time()
+    threading.Thread(target=collect_garbage, name="workspace-gc", daemon=True).start()
+    return True
@@ -0,0 +1,15 @@
+import os
+import sys
+import tempfile
+
+# Import the app's src package, and keep the databases it opens on import out of processed_data
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_scratch = tempfile.mkdtemp(prefix="ocr-tests-")
+for name, filename in (
+    ("JOBS_DB_PATH", "jobs.sqlite3"),
+    ("OCR_CACHE_PATH", "ocr_cache.sqlite3"),
+    ("SUBMISSIONS_DB_PATH", "submissions.sqlite3"),
+):
+    os.environ.setdefault(name, os.path.join(_scratch, filename))
+os.environ.setdefault("OCR_BACKEND", "gemini")  # No local engine needed
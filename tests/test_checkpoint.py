@@ -0,0 +1,122 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from src import workspace as workspace_module
+from src import extract_text_with_progress_bar as extract
+from src.checkpoint import Checkpoint
+from src.workspace import Workspace
+
+class SilentProgress:
+    def stage(self, *args, **kwargs):
+        pass
+
+    def advance(self, *args, **kwargs):
+        pass
+
+    def finish(self, *args, **kwargs):
+        pass
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    monkeypatch.setattr(workspace_module, "WORKSPACES_DIR", str(tmp_path / "jobs"))
+    monkeypatch.setattr(workspace_module, "CROPS_ROOT", str(tmp_path / "crops"))
+    ws = Workspace("ab" * 16).create()
+    yield ws
+    ws.release()
+
+def make_crop(filename, seed):
+    img = np.random.default_rng(seed).integers(0, 255, (60, 120, 3), dtype=np.uint8)
+    return {"filename": filename, "mime_type": "image/png", "data": cv2.imencode(".png", img)[1].tobytes()}
+
+def save_crops(workspace, filenames):
+    for filename in filenames:
+        with open(os.path.join(workspace.crops_dir, filename), "wb") as f:
+            f.write(make_crop(filename, 0)["data"])
+
+# ------------------- Checkpoint -------------------
+def test_pages_and_results_survive_a_reopen(tmp_path):
+    path = str(tmp_path / "checkpoint.sqlite3")
+    checkpoint = Checkpoint(path, "pdf:ocr")
+    checkpoint.add_page(2, ["question_2_1.png"])
+    checkpoint.add_page(1, ["question_1_1.png", "question_1_2.png"])
+    checkpoint.add_results([("question_1_1.png", {"text": "一"})])
+    checkpoint.close()
+
+    checkpoint = Checkpoint(path, "pdf:ocr")
+    assert checkpoint.pages() == [(1, ["question_1_1.png", "question_1_2.png"]), (2, ["question_2_1.png"])]
+    assert checkpoint.results() == {"question_1_1.png": {"text": "一"}}
+    checkpoint.close()
+
+def test_a_different_pdf_or_mode_starts_over(tmp_path):
+    path = str(tmp_path / "checkpoint.sqlite3")
+    checkpoint = Checkpoint(path, "pdf:ocr")
+    checkpoint.add_page(1, ["question_1_1.png"])
+    checkpoint.add_results([("question_1_1.png", {"text": "一"})])
+    checkpoint.close()
+
+    checkpoint = Checkpoint(path, "pdf:fused")
+    assert checkpoint.pages() == []
+    assert checkpoint.results() == {}
+    checkpoint.close()
+
+# ------------------- Restored Pages -------------------
+def test_only_the_leading_run_of_pages_is_restored(workspace, tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / "checkpoint.sqlite3"), "pdf:ocr")
+    for page_number in (1, 2, 4):
+        checkpoint.add_page(page_number, [f"question_{page_number}_1.png"])
+    save_crops(workspace, ["question_1_1.png", "question_2_1.png", "question_4_1.png"])
+    assert extract.restored_pages(checkpoint, workspace) == [(1, ["question_1_1.png"]), (2, ["question_2_1.png"])]
+    checkpoint.close()
+
+def test_a_page_whose_crops_are_gone_is_not_restored(workspace, tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / "checkpoint.sqlite3"), "pdf:ocr")
+    checkpoint.add_page(1, ["question_1_1.png"])
+    checkpoint.add_page(2, ["question_2_1.png", "question_2_2.png"])
+    save_crops(workspace, ["question_1_1.png", "question_2_1.png"])
+    assert extract.restored_pages(checkpoint, workspace) == [(1, ["question_1_1.png"])]
+    checkpoint.close()
+
+# ------------------- Resume -------------------
+def test_a_resumed_run_only_sends_the_unfinished_crops(workspace, monkeypatch):
+    sent = []
+
+    def generate(items, verify=False):
+        sent.extend(image_id for image_id, _ in items)
+        return {image_id: f"text of {image_id}" for image_id, _ in items}
+
+    monkeypatch.setattr(extract, "_generate_batch_text", generate)
+    checkpoint = Checkpoint(workspace.checkpoint_file, "pdf:ocr")
+    checkpoint.add_results([("question_1_1.png", {"text": "一"})])
+    save_crops(workspace, ["question_1_1.png"])
+
+    records = []
+    run = extract.OCRRun(workspace, batch_size=10, on_result=records.extend, progress=SilentProgress(),
+                         metrics={}, checkpoint=checkpoint)
+    run.add(["question_1_1.png", make_crop("question_1_2.png", 1)])
+    data = run.finish()
+
+    assert sent == ["img2"]
+    assert [record["text"] for record in data] == ["一", "text of img2"]
+    assert run.sources["checkpoint"] == 1 and run.sources["gemini"] == 1
+    assert len(records) == 2
+    # The new crop is checkpointed too, so another resume sends nothing
+    assert checkpoint.results() == {"question_1_1.png": {"text": "一"}, "question_1_2.png": {"text": "text of img2"}}
+    checkpoint.close()
+
+def test_failed_crops_are_not_checkpointed(workspace, monkeypatch):
+    def generate(items, verify=False):
+        raise ValueError("bad request")
+
+    monkeypatch.setattr(extract, "_generate_batch_text", generate)
+    checkpoint = Checkpoint(workspace.checkpoint_file, "pdf:ocr")
+    metrics = {}
+    run = extract.OCRRun(workspace, batch_size=10, progress=SilentProgress(), metrics=metrics, checkpoint=checkpoint)
+    run.add([make_crop("question_1_1.png", 2)])
+    run.finish()
+
+    assert metrics["failed_crops"] == 1
+    assert checkpoint.results() == {}
+    checkpoint.close()
@@ -0,0 +1,97 @@
+import time
+
+import pytest
+from google.api_core import exceptions as api_exceptions
+
+from src import gemini_scheduler
+from src.gemini_scheduler import GeminiScheduler, TokenBucket, estimate_tokens, is_rate_limited
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(gemini_scheduler, "GEMINI_BACKOFF_SECONDS", 0.0)
+
+def flaky(*errors, result="ok"):
+    """A call raising errors one by one, then returning result; calls counts the attempts."""
+    remaining = list(errors)
+
+    def call():
+        call.calls += 1
+        if remaining:
+            raise remaining.pop(0)
+        return result
+
+    call.calls = 0
+    return call
+
+# ------------------- Token Bucket -------------------
+def test_a_full_bucket_does_not_block():
+    bucket = TokenBucket(60)
+    start = time.monotonic()
+    for _ in range(60):
+        bucket.acquire()
+    assert time.monotonic() - start < 0.1
+
+def test_an_empty_bucket_waits_for_the_refill():
+    bucket = TokenBucket(6000)  # 100 tokens per second
+    bucket.drain()
+    start = time.monotonic()
+    bucket.acquire(10)
+    assert 0.05 <= time.monotonic() - start < 1.0
+
+def test_an_oversized_request_takes_the_whole_capacity():
+    bucket = TokenBucket(60)
+    bucket.acquire(1000)
+    assert bucket.tokens < 1
+
+# ------------------- Retries -------------------
+def test_rate_limits_are_retried():
+    call = flaky(api_exceptions.ResourceExhausted("quota"), api_exceptions.TooManyRequests("slow down"))
+    assert GeminiScheduler(max_retries=3, requests_per_minute=6000).submit(call).result(timeout=5) == "ok"
+    assert call.calls == 3
+
+def test_unavailable_and_other_transient_errors_are_retried():
+    call = flaky(api_exceptions.ServiceUnavailable("503"), api_exceptions.InternalServerError("500"))
+    assert GeminiScheduler(max_retries=3).submit(call).result(timeout=5) == "ok"
+    assert call.calls == 3
+
+def test_a_429_in_the_message_counts_as_a_rate_limit():
+    assert is_rate_limited(RuntimeError("429 Resource has been exhausted"))
+    call = flaky(RuntimeError("429 Resource has been exhausted"))
+    assert GeminiScheduler(max_retries=1, requests_per_minute=6000).submit(call).result(timeout=5) == "ok"
+    assert call.calls == 2
+
+def test_other_errors_are_not_retried():
+    call = flaky(ValueError("bad request"))
+    with pytest.raises(ValueError):
+        GeminiScheduler(max_retries=3).submit(call).result(timeout=5)
+    assert call.calls == 1
+
+def test_the_last_error_is_raised_once_the_retries_run_out():
+    call = flaky(*[api_exceptions.ServiceUnavailable("503")] * 3)
+    with pytest.raises(api_exceptions.ServiceUnavailable):
+        GeminiScheduler(max_retries=2).submit(call).result(timeout=5)
+    assert call.calls == 3
+
+def test_a_rate_limit_drains_the_request_bucket():
+    scheduler = GeminiScheduler(max_retries=1, requests_per_minute=600)
+    start = time.monotonic()
+    scheduler.submit(flaky(api_exceptions.ResourceExhausted("quota"))).result(timeout=5)
+    assert time.monotonic() - start >= 0.05  # The retry waited for a token (10 per second) after the drain
+
+def test_calls_are_limited_by_the_request_rate():
+    scheduler = GeminiScheduler(max_in_flight=4, requests_per_minute=600)
+    scheduler.request_bucket.drain()
+    start = time.monotonic()
+    futures = [scheduler.submit(lambda: None) for _ in range(5)]
+    for future in futures:
+        future.result(timeout=5)
+    assert time.monotonic() - start >= 0.4  # 5 tokens at 10 per second
+
+def test_keyword_arguments_reach_the_call():
+    scheduler = GeminiScheduler()
+    assert scheduler.submit(lambda a, b=0: a + b, 1, b=2, tokens=10).result(timeout=5) == 3
+
+# ------------------- Token Estimates -------------------
+def test_text_tokens_are_estimated_from_its_length():
+    assert estimate_tokens("x" * 400) == 101
+    assert estimate_tokens(["x" * 40, "x" * 40]) == 2 * estimate_tokens("x" * 40)
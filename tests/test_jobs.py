@@ -0,0 +1,153 @@
+import time
+import threading
+
+import pytest
+
+from src.jobs import JobQueue, QueueFullError
+
+def wait_for(queue, job_id, statuses=("completed", "failed"), timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.get(job_id)
+        if job["status"] in statuses:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"Job {job_id} is still {queue.get(job_id)['status']}")
+
+def recorder():
+    """A job handler recording (job_id, params) and publishing one result."""
+    def handler(job_id, params, jobs):
+        handler.runs.append((job_id, params))
+        jobs.update_progress(job_id, crops_done=1)
+        jobs.add_results(job_id, [{"text": params.get("text", "")}])
+
+    handler.runs = []
+    return handler
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / "jobs.sqlite3")
+
+def interrupt(queue, job_id, status):
+    """Leave a job as a crashed process would: queued or running, last touched long ago."""
+    queue._execute("UPDATE jobs SET status = ?, updated_at = 0 WHERE id = ?", (status, job_id))
+
+# ------------------- Running Jobs -------------------
+def test_a_job_runs_and_keeps_its_results(db):
+    handler = recorder()
+    queue = JobQueue(handler, path=db, workers=1)
+    queue.start()
+    job_id = queue.submit({"text": "一"})
+    job = wait_for(queue, job_id)
+    assert job["status"] == "completed"
+    assert job["progress"] == {"crops_done": 1}
+    assert job["extracted_data"] == [{"text": "一"}]
+    assert handler.runs == [(job_id, {"text": "一"})]
+
+def test_a_failed_job_can_be_retried(db):
+    attempts = []
+
+    def handler(job_id, params, jobs):
+        attempts.append(job_id)
+        if len(attempts) == 1:
+            raise RuntimeError("3 crops failed")
+
+    queue = JobQueue(handler, path=db, workers=1)
+    queue.start()
+    job_id = queue.submit({})
+    job = wait_for(queue, job_id)
+    assert (job["status"], job["error"]) == ("failed", "3 crops failed")
+
+    assert queue.retry(job_id)
+    job = wait_for(queue, job_id)
+    assert (job["status"], job["error"]) == ("completed", None)
+    assert not queue.retry("unknown")
+
+def test_a_full_queue_refuses_new_jobs(db):
+    queue = JobQueue(recorder(), path=db, max_depth=2)  # Not started, so nothing is taken off the queue
+    queue.submit({})
+    queue.submit({})
+    with pytest.raises(QueueFullError):
+        queue.submit({})
+
+def test_a_job_in_two_queues_runs_once(db):
+    runs = []
+    release = threading.Event()
+
+    def handler(job_id, params, jobs):
+        runs.append(job_id)
+        release.wait(1)
+
+    first, second = JobQueue(handler, path=db, workers=2), JobQueue(handler, path=db, workers=2)
+    job_id = first.submit({})
+    second.pending.put(job_id)
+    first.start()
+    second.start()
+    release.set()
+    wait_for(first, job_id)
+    time.sleep(0.1)
+    assert runs == [job_id]
+
+# ------------------- Recovery -------------------
+def test_queued_and_running_jobs_are_requeued_on_restart(db):
+    crashed = JobQueue(recorder(), path=db)
+    queued, running = crashed.submit({"text": "queued"}), crashed.submit({"text": "running"})
+    interrupt(crashed, queued, "queued")
+    interrupt(crashed, running, "running")
+
+    handler = recorder()
+    restarted = JobQueue(handler, path=db, workers=1)
+    restarted.start()
+    assert wait_for(restarted, queued)["status"] == "completed"
+    assert wait_for(restarted, running)["status"] == "completed"
+    assert sorted(job_id for job_id, _ in handler.runs) == sorted([queued, running])
+
+def test_a_restarted_job_starts_its_results_over(db):
+    crashed = JobQueue(recorder(), path=db)
+    job_id = crashed.submit({"text": "一"})
+    crashed.add_results(job_id, [{"text": "partial"}])
+    interrupt(crashed, job_id, "running")
+
+    restarted = JobQueue(recorder(), path=db, workers=1)
+    restarted.start()
+    assert wait_for(restarted, job_id)["extracted_data"] == [{"text": "一"}]
+
+def test_without_recover_other_processes_jobs_are_left_alone(db):
+    crashed = JobQueue(recorder(), path=db)
+    job_id = crashed.submit({})
+    interrupt(crashed, job_id, "running")
+
+    handler = recorder()
+    sibling = JobQueue(handler, path=db, workers=1, recover=False)
+    sibling.start()
+    time.sleep(0.2)
+    assert handler.runs == []
+    assert sibling.get(job_id)["status"] == "running"
+
+def test_jobs_touched_since_the_start_are_not_recovered(db):
+    live = JobQueue(recorder(), path=db)
+    job_id = live.submit({})  # Queued by a live process after the restart time below
+    live._execute("UPDATE jobs SET status = 'running' WHERE id = ?", (job_id,))
+
+    handler = recorder()
+    recovering = JobQueue(handler, path=db, workers=1)
+    recovering.started_at = time.time() - 60
+    recovering.start()
+    time.sleep(0.2)
+    assert handler.runs == []
+
+def test_a_restarted_worker_takes_back_its_own_jobs(db):
+    crashed = JobQueue(recorder(), path=db, recover=False, worker_id="1")
+    own_queued, own_running = crashed.submit({}), crashed.submit({})
+    crashed._execute("UPDATE jobs SET status = 'running' WHERE id = ?", (own_running,))
+    sibling = JobQueue(recorder(), path=db, recover=False, worker_id="0")
+    other = sibling.submit({})
+
+    handler = recorder()
+    restarted = JobQueue(handler, path=db, workers=1, recover=False, worker_id="1")
+    restarted.start()
+    wait_for(restarted, own_queued)
+    wait_for(restarted, own_running)
+    time.sleep(0.1)
+    assert sorted(job_id for job_id, _ in handler.runs) == sorted([own_queued, own_running])
+    assert restarted.get(other)["status"] == "queued"
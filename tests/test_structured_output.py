@@ -0,0 +1,104 @@
+import json
+from concurrent.futures import Future
+
+from src.structured_output import items_config, records_config, parse_items, parse_records, resolve_batch
+
+def done(value):
+    future = Future()
+    future.set_result(value)
+    return future
+
+def failed(error):
+    future = Future()
+    future.set_exception(error)
+    return future
+
+# ------------------- Schemas -------------------
+def test_records_config_requires_every_field_and_lists_allowed_values():
+    config = records_config({"text": None, "verdict": ("Correct", "Incorrect")})
+    items = config["response_schema"]["items"]
+    assert config["response_mime_type"] == "application/json"
+    assert items["required"] == ["id", "text", "verdict"]
+    assert "enum" not in items["properties"]["text"]
+    assert items["properties"]["verdict"]["enum"] == ["Correct", "Incorrect"]
+
+def test_items_config_is_a_single_field_record():
+    assert items_config("text") == records_config({"text": None})
+
+# ------------------- Parsing -------------------
+def test_answers_are_matched_by_id_not_position():
+    answer = json.dumps([{"id": "img2", "text": "二"}, {"id": "img1", "text": "一"}])
+    assert parse_items(answer, ["img1", "img2"], "text") == {"img1": "一", "img2": "二"}
+
+def test_missing_ids_are_left_out():
+    answer = json.dumps([{"id": "img1", "text": "一"}])
+    assert parse_items(answer, ["img1", "img2", "img3"], "text") == {"img1": "一"}
+
+def test_unknown_ids_are_dropped():
+    answer = json.dumps([{"id": "img9", "text": "九"}, {"id": "img1", "text": "一"}])
+    assert parse_items(answer, ["img1"], "text") == {"img1": "一"}
+
+def test_duplicate_ids_keep_the_first_answer():
+    answer = json.dumps([{"id": "img1", "text": "first"}, {"id": "img1", "text": "second"}])
+    assert parse_items(answer, ["img1"], "text") == {"img1": "first"}
+
+def test_ids_and_values_are_stripped():
+    answer = json.dumps([{"id": " img1 ", "text": "  一  "}])
+    assert parse_items(answer, ["img1"], "text") == {"img1": "一"}
+
+def test_items_with_a_missing_or_invalid_field_are_dropped():
+    fields = {"text": None, "verdict": ("Correct", "Incorrect")}
+    answer = json.dumps([
+        {"id": "img1", "text": "一", "verdict": "Correct"},
+        {"id": "img2", "text": "二"},
+        {"id": "img3", "text": 3, "verdict": "Correct"},
+        {"id": "img4", "text": "四", "verdict": "Maybe"},
+        "img5",
+    ])
+    records = parse_records(answer, ["img1", "img2", "img3", "img4", "img5"], fields)
+    assert records == {"img1": {"text": "一", "verdict": "Correct"}}
+
+def test_an_object_wrapping_the_items_is_accepted():
+    answer = json.dumps({"items": [{"id": "img1", "text": "一"}]})
+    assert parse_items(answer, ["img1"], "text") == {"img1": "一"}
+
+def test_invalid_json_answers_nothing():
+    assert parse_items("[{\"id\": \"img1\",", ["img1"], "text") == {}
+    assert parse_items("", ["img1"], "text") == {}
+    assert parse_items("\"text\"", ["img1"], "text") == {}
+
+# ------------------- Re-requests -------------------
+def test_only_the_missed_ids_are_requested_again():
+    requested = []
+
+    def resubmit(ids):
+        requested.append(ids)
+        return done({item_id: item_id.upper() for item_id in ids})
+
+    values, error = resolve_batch(done({"a": "A"}), ["a", "b", "c"], resubmit)
+    assert error is None
+    assert values == {"a": "A", "b": "B", "c": "C"}
+    assert requested == [["b", "c"]]
+
+def test_re_requests_stop_after_the_retries():
+    requested = []
+
+    def resubmit(ids):
+        requested.append(ids)
+        return done({})
+
+    values, error = resolve_batch(done({"a": "A"}), ["a", "b"], resubmit, retries=2)
+    assert (values, error) == ({"a": "A"}, None)
+    assert requested == [["b"], ["b"]]
+
+def test_a_complete_answer_is_not_requested_again():
+    def resubmit(ids):
+        raise AssertionError("nothing was missing")
+
+    assert resolve_batch(done({"a": "A", "b": "B"}), ["a", "b"], resubmit) == ({"a": "A", "b": "B"}, None)
+
+def test_a_failed_call_returns_what_was_answered_and_the_error():
+    error = RuntimeError("quota")
+    values, returned = resolve_batch(done({"a": "A"}), ["a", "b"], lambda ids: failed(error))
+    assert values == {"a": "A"}
+    assert returned is error